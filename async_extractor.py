@@ -0,0 +1,203 @@
+# async_extractor.py
+import time
+import queue
+import random
+import asyncio
+import threading
+from typing import List
+import openai
+from config import LLM_CONCURRENCY, LLM_RPM, LLM_TPM, LLM_MAX_RETRIES, GLEAN_MAX_PASSES
+from extractor import gleaning_conversation, estimate_tokens, record_llm_usage, build_summary_messages
+from stage_timer import TIMER
+
+# Errors worth retrying: rate limits, server-side failures and timeouts
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+)
+
+def _is_retryable(error) -> bool:
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    # Generic API errors are retried only for 5xx responses
+    return isinstance(error, openai.error.APIError) and (error.http_status or 500) >= 500
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` tokens are available and take them"""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AsyncExtractionEngine:
+    """Run many entity extraction requests concurrently under RPM/TPM limits"""
+
+    def __init__(self, model="gpt-4o-mini", entity_types: List[str] = None, max_concurrency=LLM_CONCURRENCY,
+                 rpm=LLM_RPM, tpm=LLM_TPM, max_retries=LLM_MAX_RETRIES, max_completion_tokens=512,
+                 base_backoff=1.0, max_backoff=60.0, request_timeout=120, cache=None,
+                 max_gleanings=GLEAN_MAX_PASSES):
+        self.model = model
+        self.entity_types = entity_types
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.max_completion_tokens = max_completion_tokens
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.request_timeout = request_timeout
+        # Optional LLMResponseCache consulted before any request is issued
+        self.cache = cache
+        self.max_gleanings = max_gleanings
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    async def _create(self, messages, **params):
+        """Issue one chat completion under the rate limits, retrying transient errors with jitter"""
+        estimated = sum(estimate_tokens(m["content"]) for m in messages) + self.max_completion_tokens
+        for attempt in range(self.max_retries + 1):
+            # Waiting for RPM/TPM budget and a concurrency slot is reported apart from the call itself
+            start = time.perf_counter()
+            await self._request_bucket.acquire(1)
+            await self._token_bucket.acquire(estimated)
+            async with self._semaphore:
+                TIMER.add("llm_rate_limit_wait", time.perf_counter() - start)
+                self.stats["requests"] += 1
+                start = time.perf_counter()
+                try:
+                    return await openai.ChatCompletion.acreate(
+                        model=self.model,
+                        messages=messages,
+                        request_timeout=self.request_timeout,
+                        **params
+                    )
+                except Exception as e:
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        self.stats["failures"] += 1
+                        raise
+                    error = e
+                finally:
+                    TIMER.add("llm", time.perf_counter() - start)
+            # Back off outside the semaphore so other requests can proceed
+            self.stats["retries"] += 1
+            retry_after = getattr(error, "headers", None) or {}
+            delay = float(retry_after.get("retry-after", 0) or 0)
+            delay = max(delay, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+            with TIMER.time("llm_retry_backoff"):
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def _complete(self, messages, **params) -> str:
+        """Return the completion content, from the cache when possible"""
+        raw = self.cache.get(self.model, messages, params) if self.cache is not None else None
+        if raw is None:
+            start = time.perf_counter()
+            resp = await self._create(messages, **params)
+            record_llm_usage(resp)
+            raw = resp["choices"][0]["message"]["content"]
+            if self.cache is not None:
+                self.cache.put(self.model, messages, params, raw, time.perf_counter() - start)
+        return raw
+
+    async def extract(self, text: str) -> str:
+        """Extract the raw entity/relationship records of one report, gleaning if enabled"""
+        steps = gleaning_conversation(text, self.entity_types, self.max_gleanings)
+        messages, params = next(steps)
+        try:
+            while True:
+                messages, params = steps.send(await self._complete(messages, **params))
+        except StopIteration as stop:
+            return stop.value
+
+    async def summarize(self, item) -> str:
+        """Summarize the description list of one (entity_name, descriptions) item"""
+        name, descriptions = item
+        return await self._complete(build_summary_messages(name, descriptions), temperature=0,
+                                    max_tokens=self.max_completion_tokens)
+
+    async def extract_many(self, texts, fn=None):
+        """Yield (index, raw or exception) for every text, in input order.
+
+        fn is the coroutine applied to each item, extract by default. At most
+        a few windows of requests are scheduled ahead of the consumer, so a
+        slow downstream writer applies backpressure to the requests.
+        """
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._request_bucket = TokenBucket(self.rpm, capacity=max(1, self.max_concurrency))
+        self._token_bucket = TokenBucket(self.tpm)
+
+        window = self.max_concurrency * 4
+        pending = []
+        for idx, text in enumerate(texts):
+            pending.append((idx, asyncio.ensure_future(self._safe_extract(text, fn or self.extract))))
+            if len(pending) >= window:
+                idx, task = pending.pop(0)
+                yield idx, await task
+        for idx, task in pending:
+            yield idx, await task
+
+    async def _safe_extract(self, text, fn):
+        try:
+            return await fn(text)
+        except Exception as e:
+            return e
+
+    def extract_in_order(self, texts, fn=None):
+        """Synchronous generator over extract_many, running the event loop in a background thread"""
+        results = queue.Queue(maxsize=self.max_concurrency * 4)
+        stop = threading.Event()
+        done = object()
+
+        async def produce():
+            loop = asyncio.get_running_loop()
+            async for item in self.extract_many(texts, fn):
+                if stop.is_set():
+                    break
+                await loop.run_in_executor(None, results.put, item)
+            await loop.run_in_executor(None, results.put, done)
+
+        def run():
+            try:
+                asyncio.run(produce())
+            except Exception as e:
+                results.put(e)
+                results.put(done)
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting on a full queue
+            while worker.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
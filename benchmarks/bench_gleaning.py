@@ -0,0 +1,69 @@
+# benchmarks/bench_gleaning.py
+"""Recall per second of single-pass extraction vs. budgeted gleaning.
+
+Runs against mock_openai_server.py started in-process on a free port. The
+server's canned records are the ground truth, and --entities-per-pass caps
+how many entities each pass returns so that gleaning has something to find.
+
+Usage:
+    python benchmarks/bench_gleaning.py --text-file report_10.txt --entities-per-pass 3 --latency-ms 300
+"""
+import os
+import sys
+import time
+import itertools
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# config is read at import time; the API base is pointed at the mock server in main()
+os.environ["USE_OPENAI"] = "true"
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+import openai
+from config import TUPLE_DELIM
+from loaders import iter_report_file
+from extractor import call_llm_entity_extraction_gleaning, parse_entity_extraction_output, normalize_entity_name
+from mock_openai_server import make_server, parse_arguments as mock_arguments, extract_canned_records
+
+
+def run(texts, glean_passes, min_tokens):
+    """Extract every report; return (entity recall, seconds)"""
+    found = expected = 0
+    start = time.perf_counter()
+    for text in texts:
+        raw = call_llm_entity_extraction_gleaning(text, max_gleanings=glean_passes, min_tokens=min_tokens)
+        names = {e["name"] for e in parse_entity_extraction_output(raw)["entities"]}
+        truth = {normalize_entity_name(rec.split(TUPLE_DELIM)[1]) for rec in extract_canned_records(text)[0]}
+        found += len(names & truth)
+        expected += len(truth)
+    return found / max(expected, 1), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-pass extraction with gleaning on the mock server")
+    parser.add_argument("--text-file", default="report_10.txt")
+    parser.add_argument("--limit", type=int, default=50, help="Number of reports to process")
+    parser.add_argument("--passes", type=int, nargs="+", default=[1, 2, 4], help="Gleaning pass limits to compare")
+    parser.add_argument("--min-tokens", type=int, default=0, help="Gleaning threshold passed to the extractor")
+    parser.add_argument("--entities-per-pass", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    server = make_server(mock_arguments(["--port", "0", "--entities-per-pass", str(args.entities_per_pass),
+                                         "--latency-ms", str(args.latency_ms)]))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    openai.api_base = f"http://127.0.0.1:{server.server_port}/v1"
+
+    texts = list(itertools.islice(iter_report_file(args.text_file), args.limit))
+    stats = server.RequestHandlerClass.behaviour.stats
+    for passes in [0] + args.passes:
+        requests_before = stats["requests"]
+        recall, seconds = run(texts, passes, args.min_tokens)
+        label = "single pass" if passes == 0 else f"glean <= {passes}"
+        print(f"{label:14s} recall {recall:.3f} in {seconds:.2f}s ({recall/seconds:.4f} recall/s, "
+              f"{stats['requests'] - requests_before} requests)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# benchmarks/bench_parser.py
+"""Micro-benchmark and fuzz check for parse_entity_extraction_output.
+
+The fuzz check also streams every input through IncrementalRecordParser in
+random chunks and checks that it yields the same entities and relationships.
+
+Usage:
+    USE_OPENAI=false python benchmarks/bench_parser.py --size-mb 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from config import TUPLE_DELIM, RECORD_DELIM, COMPLETION_DELIM
+from extractor import parse_entity_extraction_output, IncrementalRecordParser, merge_repeated_entities
+
+FUZZ_CORPUS = os.path.join(os.path.dirname(__file__), "parser_fuzz_corpus.jsonl")
+
+ANATOMY = ["LUNG", "LEFT LOWER LOBE", "HEART", "MEDIASTINUM", "PLEURA", "SPINE", "DIAPHRAGM", "HILUM"]
+FINDINGS = ["NODULE", "EFFUSION", "ATELECTASIS", "CARDIOMEGALY", "GRANULOMA", "PNEUMOTHORAX", "OPACITY"]
+
+
+def legacy_parse(raw: str):
+    """The original split/strip parser, kept for comparison"""
+    records = [r.strip() for r in raw.split(RECORD_DELIM) if r.strip()]
+    entities, relationships = [], []
+    for rec in records:
+        parts = [p.strip().strip('"') for p in rec.strip().strip("() ").split(TUPLE_DELIM)]
+        tag = parts[0].lower()
+        if tag == "entity" and len(parts) >= 4:
+            entities.append({"name": parts[1], "type": parts[2], "description": parts[3]})
+        elif tag == "relationship" and len(parts) >= 5:
+            relationships.append({"source": parts[1], "target": parts[2],
+                                  "description": parts[3], "strength": parts[4]})
+    return {"entities": entities, "relationships": relationships}
+
+
+def synthetic_output(size_bytes: int, seed: int = 0) -> str:
+    """Generate a well-formed extraction output of roughly size_bytes"""
+    rng = random.Random(seed)
+    records, size = [], 0
+    while size < size_bytes:
+        if rng.random() < 0.6:
+            name = rng.choice(ANATOMY + FINDINGS)
+            rec = f'("entity"{TUPLE_DELIM}{name}{TUPLE_DELIM}finding{TUPLE_DELIM}observed in the {rng.choice(ANATOMY).lower()} (series {rng.randint(1, 9)}))'
+        else:
+            rec = (f'("relationship"{TUPLE_DELIM}{rng.choice(ANATOMY)}{TUPLE_DELIM}{rng.choice(FINDINGS)}'
+                   f'{TUPLE_DELIM}location of finding{TUPLE_DELIM}{rng.randint(1, 10)})')
+        records.append(rec)
+        size += len(rec) + len(RECORD_DELIM)
+    return RECORD_DELIM.join(records) + COMPLETION_DELIM
+
+
+def mutate(raw: str, rng: random.Random) -> str:
+    """Apply a random truncation, splice, duplication or delimiter injection"""
+    if not raw:
+        return rng.choice([TUPLE_DELIM, RECORD_DELIM, '"', "(", ")"])
+    i, j = sorted(rng.randrange(len(raw) + 1) for _ in range(2))
+    op = rng.randrange(4)
+    if op == 0:
+        return raw[:i]
+    if op == 1:
+        return raw[:i] + raw[j:]
+    if op == 2:
+        return raw[:j] + raw[i:j] + raw[j:]
+    return raw[:i] + rng.choice([TUPLE_DELIM, RECORD_DELIM, COMPLETION_DELIM, '"', "(", ")", "\n"]) + raw[i:]
+
+
+def time_parsers(parsers: dict, raw: str, repeat: int) -> dict:
+    """Best time of each parser; runs are interleaved so load spikes hit all of them alike"""
+    best = {name: float("inf") for name in parsers}
+    for _ in range(repeat):
+        for name, parser in parsers.items():
+            start = time.perf_counter()
+            parser(raw)
+            best[name] = min(best[name], time.perf_counter() - start)
+    return best
+
+
+def stream_parse(raw: str, rng: random.Random):
+    """Parse raw the way --stream does: fed in random chunks, every record written, then merged"""
+    parser, records = IncrementalRecordParser(), []
+    for i in range(0, len(raw), 16):
+        chunk = raw[i:i + 16]
+        cut = rng.randint(0, len(chunk))
+        records += parser.feed(chunk[:cut]) + parser.feed(chunk[cut:])
+    records += parser.close()
+    written = {"entities": [], "relationships": []}
+    for tag, value in records:
+        if tag == "entity":
+            written["entities"].append(value)
+        elif tag == "relationship":
+            written["relationships"].append(value)
+    return merge_repeated_entities(written)
+
+
+def run_fuzz(iterations: int, seed: int = 0) -> int:
+    """Parse the corpus and random mutations of it; return the number of inputs checked"""
+    with open(FUZZ_CORPUS, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    corpus.append(synthetic_output(2000, seed))
+    rng = random.Random(seed)
+    checked = 0
+    for raw in corpus:
+        assert stream_parse(raw, rng) == parse_entity_extraction_output(raw), raw
+        parse_entity_extraction_output(raw, packed=True)
+        checked += 1
+    for _ in range(iterations):
+        raw = mutate(rng.choice(corpus), rng)
+        parsed = parse_entity_extraction_output(raw)
+        assert stream_parse(raw, rng) == parsed, raw
+        for ent in parsed["entities"]:
+            assert ent["name"] and isinstance(ent["description"], str), raw
+        for rel in parsed["relationships"]:
+            assert isinstance(rel["strength"], float), raw
+        checked += 1
+    return checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and fuzz the extraction output parser")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="Size of the synthetic output")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions, best is reported")
+    parser.add_argument("--fuzz", type=int, default=20000, help="Number of mutated inputs to parse")
+    args = parser.parse_args()
+
+    raw = synthetic_output(int(args.size_mb * 1024 * 1024))
+    size_mb = len(raw) / (1024 * 1024)
+    records = raw.count(RECORD_DELIM) + 1
+    timings = time_parsers({"typed": parse_entity_extraction_output, "legacy": legacy_parse}, raw, args.repeat)
+    for name, seconds in timings.items():
+        print(f"{name:12s} {size_mb:.1f} MB, {records} records: {seconds*1000:.1f} ms "
+              f"({size_mb/seconds:.1f} MB/s, {records/seconds:,.0f} records/s)")
+
+    print(f"fuzz: {run_fuzz(args.fuzz)} inputs parsed without errors, streamed and batch output match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_spacy.py
+"""Throughput of the spaCy fallback extractor on report.txt.
+
+Compares reloading the model per report (the previous behaviour), the
+cached pipeline called per report, and batched nlp.pipe.
+
+Usage:
+    USE_OPENAI=false python benchmarks/bench_spacy.py --text-file report.txt --limit 500
+"""
+import os
+import sys
+import time
+import itertools
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from loaders import iter_report_file
+from extractor import get_spacy_nlp, spacy_fallback_extract, spacy_fallback_extract_batch
+
+
+def reload_per_report(texts):
+    import spacy
+    for text in texts:
+        spacy.load("en_core_web_sm")(text)
+
+
+def cached_per_report(texts):
+    for text in texts:
+        spacy_fallback_extract(text)
+
+
+def batched(texts, batch_size, n_process):
+    for _ in spacy_fallback_extract_batch(texts, batch_size=batch_size, n_process=n_process):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the spaCy fallback extractor")
+    parser.add_argument("--text-file", default="report.txt")
+    parser.add_argument("--limit", type=int, default=500, help="Number of reports to process")
+    parser.add_argument("--reload-limit", type=int, default=20,
+                        help="Reports for the slow reload-per-report baseline")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
+    texts = list(itertools.islice(iter_report_file(args.text_file), args.limit))
+    get_spacy_nlp()  # exclude the one-off load from the cached variants
+
+    runs = [
+        ("reload per report", lambda: reload_per_report(texts[:args.reload_limit]), args.reload_limit),
+        ("cached per report", lambda: cached_per_report(texts), len(texts)),
+        (f"nlp.pipe batch={args.batch_size} n_process={args.processes}",
+         lambda: batched(texts, args.batch_size, args.processes), len(texts)),
+    ]
+    for name, run, count in runs:
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        print(f"{name:40s} {count:5d} docs in {seconds:7.2f}s  ({count/seconds:8.1f} docs/s)")
+
+
+if __name__ == "__main__":
+    main()
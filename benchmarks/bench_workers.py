@@ -0,0 +1,50 @@
+# benchmarks/bench_workers.py
+"""Scaling of main.py --workers from 1 to N processes.
+
+Each run clears the database and ingests the same reports from scratch, so
+it needs a Neo4j instance it may wipe. Point OPENAI_API_BASE at
+mock_openai_server.py (or set USE_OPENAI=false) to keep the LLM out of the
+measurement.
+
+Usage:
+    python benchmarks/bench_workers.py --text-file report_50.txt --image-dir ./images_50/ --max-workers 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def run(workers, args, journal):
+    command = [sys.executable, os.path.join(ROOT, "main.py"), "--clear-db", "--no-llm-cache",
+               "--text-file", args.text_file, "--image-dir", args.image_dir,
+               "--workers", str(workers), "--journal", journal]
+    start = time.perf_counter()
+    subprocess.run(command, check=True, cwd=ROOT, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ingestion scaling with the number of worker processes")
+    parser.add_argument("--text-file", default="report_50.txt")
+    parser.add_argument("--image-dir", default="./images_50/")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    counts = sorted({1, args.max_workers} | {n for n in (2, 4, 8, 16) if n < args.max_workers})
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for workers in counts:
+            seconds = run(workers, args, os.path.join(tmp, f"journal_{workers}.jsonl"))
+            baseline = baseline or seconds
+            speedup = baseline / seconds
+            print(f"{workers:3d} workers: {seconds:7.1f}s  speedup {speedup:4.2f}x  "
+                  f"efficiency {speedup / workers:4.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# benchmarks/run.py
+"""Offline benchmark suite for the ingestion and VQA hot paths.
+
+Groups (select with --only):
+    parser      parse_entity_extraction_output on large synthetic outputs
+    image       ImageProcessor image/text features and calculate_similarity on images_10
+    neo4j       Neo4jClient writes and reads against an in-memory stand-in driver
+    similar     find_similar_images over 1k, 10k and 100k synthetic vectors
+
+The stand-in driver answers queries from canned records, so the neo4j and
+similar groups measure the client side (query dispatch, record handling,
+similarity ranking in Python), not the database. Inputs are seeded, so two
+runs on the same machine time the same work. Results are written as JSON
+with machine metadata and compared against a baseline recorded on the same
+machine (none is committed; the first run records it):
+
+    python benchmarks/run.py --save-baseline          # record benchmarks/baseline.json
+    python benchmarks/run.py --only parser,similar    # compare against it
+"""
+import os
+import gc
+import sys
+import json
+import glob
+import time
+import random
+import platform
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# The suite must not need an API key or a running model server
+os.environ.setdefault("USE_OPENAI", "false")
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+GROUPS = ["parser", "image", "neo4j", "similar"]
+
+
+def measure(fn, repeat=5, number=1, warmup=1) -> dict:
+    """Time fn: best, median and mean seconds per call over repeat rounds of number calls"""
+    for _ in range(warmup):
+        fn()
+    rounds = []
+    gc.collect()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min_s": min(rounds),
+        "median_s": statistics.median(rounds),
+        "mean_s": statistics.fmean(rounds),
+        "stdev_s": statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+    }
+
+
+def machine_metadata() -> dict:
+    """Where and on what the results were measured"""
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    try:
+        meta["git_commit"] = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        meta["git_commit"] = None
+    for module in ("numpy", "torch", "transformers", "sklearn", "neo4j"):
+        try:
+            meta[f"{module}_version"] = __import__(module).__version__
+        except ImportError:
+            meta[f"{module}_version"] = None
+    try:
+        import torch
+        meta["torch_threads"] = torch.get_num_threads()
+        meta["cuda"] = torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+    except ImportError:
+        pass
+    return meta
+
+
+# ---------------------------------------------------------------- parser
+
+def bench_parser(args):
+    from bench_parser import synthetic_output
+    from extractor import parse_entity_extraction_output
+    results = {}
+    for size_kb in (64, 1024, 4096):
+        raw = synthetic_output(size_kb * 1024, seed=args.seed)
+        stats = measure(lambda: parse_entity_extraction_output(raw), repeat=args.repeat)
+        stats["mb_per_s"] = len(raw) / stats["median_s"] / 1e6
+        results[f"parser/{size_kb}kb"] = stats
+    return results
+
+
+# ---------------------------------------------------------------- image
+
+def bench_image(args):
+    from image_processor import ImageProcessor
+    from loaders import iter_report_file
+    images = sorted(glob.glob(os.path.join(args.image_dir, "**", "*.png"), recursive=True))
+    if not images:
+        raise FileNotFoundError(f"no .png images under {args.image_dir}")
+    results = {}
+
+    # Loading CLIP happens once per process, so it is timed once
+    start = time.perf_counter()
+    processor = ImageProcessor()
+    seconds = time.perf_counter() - start
+    results["image/clip_load"] = {"repeat": 1, "number": 1, "min_s": seconds, "median_s": seconds,
+                                  "mean_s": seconds, "stdev_s": 0.0}
+
+    def extract_all():
+        for path in images:
+            processor.extract_features(path)
+    stats = measure(extract_all, repeat=args.repeat)
+    stats["images_per_s"] = len(images) / stats["median_s"]
+    results["image/extract_features"] = stats
+
+    texts = [line for report in iter_report_file(os.path.join(ROOT, "report_10.txt"))
+             for line in report.split(". ") if line.strip()]
+    stats = measure(lambda: processor.extract_text_features(texts[0]), repeat=args.repeat, number=10)
+    results["image/extract_text_features"] = stats
+    stats = measure(lambda: processor.extract_text_features_batch(texts), repeat=args.repeat)
+    stats["texts_per_s"] = len(texts) / stats["median_s"]
+    results["image/extract_text_features_batch"] = stats
+
+    image_features = processor.extract_features(images[0])
+    results["image/calculate_similarity"] = measure(
+        lambda: processor.calculate_similarity(texts[0], image_features), repeat=args.repeat, number=10)
+    return results
+
+
+# ---------------------------------------------------------------- neo4j stand-in
+
+class StandInResult(list):
+    """Records of one query; consume() mirrors neo4j.Result for the query profiler"""
+
+    def consume(self):
+        return None
+
+
+class StandInSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.driver.queries += 1
+        if "i.feature_vector AS feature_vector" in query:
+            return StandInResult(self.driver.images)
+        if "AS entities" in query:
+            return StandInResult([{"doc_id": "doc_1", "text": "bench report", "entities": self.driver.entities}])
+        if "RETURN" in query:
+            return StandInResult(self.driver.entities)
+        return StandInResult()
+
+
+class StandInDriver:
+    """In-memory replacement for a neo4j.Driver that answers every query from canned records"""
+
+    def __init__(self, images=(), entities=()):
+        self.images = list(images)
+        self.entities = list(entities)
+        self.queries = 0
+
+    def session(self, **config):
+        return StandInSession(self)
+
+    def close(self):
+        pass
+
+
+def stand_in_client(images=(), entities=()):
+    """A Neo4jClient whose driver is the stand-in; the real driver connects lazily and is never used"""
+    from neo4j_client import Neo4jClient
+    client = Neo4jClient(cache_ttl=0, instrument=False, profile=False)
+    client.driver.close()
+    client.driver = StandInDriver(images, entities)
+    return client
+
+
+def synthetic_vectors(n, dim, seed):
+    import numpy as np
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def bench_neo4j(args):
+    from config import FEATURE_DIM
+    rng = random.Random(args.seed)
+    entities = [{"name": f"FINDING {i}", "type": "finding", "description": f"observed in series {i}",
+                 "similarity": rng.random(), "strength": rng.randint(1, 10), "relation_desc": "located in"}
+                for i in range(50)]
+    relationships = [{"source": f"FINDING {i}", "target": f"FINDING {i + 1}", "description": "located in",
+                      "strength": "5"} for i in range(40)]
+    client = stand_in_client(entities=entities)
+    embeddings = synthetic_vectors(64, FEATURE_DIM, args.seed).tolist()
+    snapshot_rows = [{"doc_id": f"doc_{i}", "name": f"FINDING {i}", "type": "finding",
+                      "description": "observed"} for i in range(1000)]
+    cases = {
+        "neo4j/create_document_subgraph": lambda: client.create_document_subgraph(
+            "doc_1", "bench report", entities[:10], relationships[:8]),
+        "neo4j/set_entity_embeddings_64": lambda: client.set_entity_embeddings(entities[:64], embeddings),
+        "neo4j/write_snapshot_rows_1000": lambda: client.write_snapshot_rows("entities", snapshot_rows),
+        "neo4j/create_image_node": lambda: client.create_image_node("img.png", embeddings[0], "doc_1"),
+        "neo4j/get_image_context": lambda: client.get_image_context("img.png"),
+        "neo4j/get_entities_by_image": lambda: client.get_entities_by_image("img.png"),
+        "neo4j/get_related_entities": lambda: client.get_related_entities("FINDING 1", "finding"),
+    }
+    results = {}
+    for name, fn in cases.items():
+        client.driver.queries = 0
+        results[name] = measure(fn, repeat=args.repeat, number=20, warmup=0)
+        results[name]["queries_per_call"] = client.driver.queries / (args.repeat * 20)
+    return results
+
+
+def bench_similar(args):
+    from config import FEATURE_DIM
+    results = {}
+    for n in args.scales:
+        vectors = synthetic_vectors(n, FEATURE_DIM, args.seed)
+        images = [{"path": f"image_{i}.png", "feature_vector": vector} for i, vector in enumerate(vectors.tolist())]
+        client = stand_in_client(images=images)
+        query = vectors[0].tolist()
+        # Large scales take seconds per call, so they get fewer rounds and no warmup
+        small = n <= 10_000
+        stats = measure(lambda: client.find_similar_images(query, top_k=5),
+                        repeat=args.repeat if small else max(1, args.repeat // 2), warmup=1 if small else 0)
+        stats["vectors_per_s"] = n / stats["median_s"]
+        results[f"similar/find_similar_images_{n}"] = stats
+    return results
+
+
+BENCHMARKS = {"parser": bench_parser, "image": bench_image, "neo4j": bench_neo4j, "similar": bench_similar}
+
+
+# ---------------------------------------------------------------- baseline
+
+def compare(results, baseline, tolerance):
+    """Print each benchmark's median against the baseline; return the names slower than tolerance allows"""
+    regressions = []
+    print(f"\n{'benchmark':45s} {'median ms':>11s} {'baseline ms':>12s} {'change':>8s}")
+    for name, stats in sorted(results.items()):
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:45s} {stats['median_s'] * 1000:11.3f} {'-':>12s} {'new':>8s}")
+            continue
+        change = stats["median_s"] / base["median_s"] - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:45s} {stats['median_s'] * 1000:11.3f} {base['median_s'] * 1000:12.3f} {change:+8.1%}{flag}")
+    if baseline.get("machine", {}).get("platform") != platform.platform():
+        print("Note: the baseline was recorded on a different platform:", baseline.get("machine", {}).get("platform"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--only", type=str, default=",".join(GROUPS),
+                        help=f"Comma-separated groups to run (default: {','.join(GROUPS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per benchmark (default: 5)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Synthetic image counts for find_similar_images (default: 1000 10000 100000)")
+    parser.add_argument("--image-dir", type=str, default=os.path.join(ROOT, "images_10"))
+    parser.add_argument("--output", type=str, default="benchmark_results.json",
+                        help="JSON file for the results (default: benchmark_results.json)")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE,
+                        help="Baseline JSON to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Median slowdown over the baseline reported as a regression (default: 0.15)")
+    args = parser.parse_args()
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = set(groups) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    report = {"machine": machine_metadata(), "args": vars(args), "results": {}, "skipped": {}}
+    for group in groups:
+        print(f"Running {group} ...")
+        try:
+            report["results"].update(BENCHMARKS[group](args))
+        except (ImportError, OSError) as e:
+            # A missing optional dependency or dataset skips the group instead of failing the suite
+            print(f"  skipped: {e}")
+            report["skipped"][group] = str(e)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance)
+    else:
+        print(f"No baseline at {args.baseline}; record one with --save-baseline")
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,42 @@ import os
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+NEO4J_MAX_RETRIES = int(os.getenv("NEO4J_MAX_RETRIES", "5"))  # retries on deadlocks and other transient errors
 
 # === LLM / OpenAI settings ===
 USE_OPENAI = os.getenv("USE_OPENAI", "true").lower() in ("1","true","yes")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "")  # override to target an OpenAI-compatible server
+
+# === Concurrent LLM extraction settings ===
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))    # max in-flight requests
+LLM_RPM = int(os.getenv("LLM_RPM", "500"))                  # requests per minute
+LLM_TPM = int(os.getenv("LLM_TPM", "200000"))               # tokens per minute
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))    # retries on 429 / 5xx / timeouts
+
+# === Gleaning (follow-up extraction passes) ===
+GLEAN_MAX_PASSES = int(os.getenv("GLEAN_MAX_PASSES", "0"))             # 0 disables gleaning
+GLEAN_MIN_TOKENS = int(os.getenv("GLEAN_MIN_TOKENS", "60"))            # shorter reports get a single pass
+GLEAN_TIME_BUDGET = float(os.getenv("GLEAN_TIME_BUDGET", "30"))        # seconds of gleaning per report
+GLEAN_TOKEN_BUDGET = int(os.getenv("GLEAN_TOKEN_BUDGET", "2000"))      # new tokens of gleaning per report
+
+# === Persistent LLM response cache ===
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))  # 0 keeps entries forever
+LLM_CACHE_VERSION = os.getenv("LLM_CACHE_VERSION", "1")  # bump to invalidate all cached responses
+
+# === Entity description consolidation (run after ingestion) ===
+# Entities whose appended description list reaches this length get an LLM summary
+CONSOLIDATE_MIN_DESCRIPTIONS = int(os.getenv("CONSOLIDATE_MIN_DESCRIPTIONS", "3"))
+CONSOLIDATE_BATCH_SIZE = int(os.getenv("CONSOLIDATE_BATCH_SIZE", "500"))  # summaries per UNWIND write
+
+# === VQA server (vqa_server.py) ===
+VQA_SERVER_URL = os.getenv("VQA_SERVER_URL", "http://127.0.0.1:8765")  # or unix:/path/to/socket
+VQA_SERVER_WORKERS = int(os.getenv("VQA_SERVER_WORKERS", "4"))  # questions answered at the same time
+
+# === Ingestion checkpoint journal ===
+INGEST_JOURNAL_PATH = os.getenv("INGEST_JOURNAL_PATH", "ingest_journal.jsonl")
 
 # === Image processing settings ===
 IMAGE_DIR = os.getenv("IMAGE_DIR", "./images")
@@ -18,3 +50,20 @@ SIMILARITY_THRESHOLD = 0.3  # Entity-image association similarity threshold
 TUPLE_DELIM = "<|>"
 RECORD_DELIM = "##"
 COMPLETION_DELIM = "<|COMPLETE|>"
+GRAPH_FIELD_SEP = "<SEP>"  # joins the description list of the summarize prompt
+
+# === Entity embedding settings ===
+ENTITY_VECTOR_INDEX = os.getenv("ENTITY_VECTOR_INDEX", "entity_embedding")
+ENTITY_EMBEDDING_BATCH_SIZE = int(os.getenv("ENTITY_EMBEDDING_BATCH_SIZE", "64"))
+
+# === Neo4j read cache settings (TTL of 0 disables the cache) ===
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+# === Streaming read settings ===
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "1000"))  # records per network batch
+
+# === Neo4j query instrumentation ===
+NEO4J_INSTRUMENT = os.getenv("NEO4J_INSTRUMENT", "false").lower() in ("1","true","yes")
+NEO4J_PROFILE = os.getenv("NEO4J_PROFILE", "false").lower() in ("1","true","yes")  # run PROFILE for db hits
+NEO4J_PROFILE_REPORT = os.getenv("NEO4J_PROFILE_REPORT", "neo4j_profile.json")
@@ -0,0 +1,99 @@
+# consolidate.py
+"""Merge the descriptions ingestion appended to each entity into one summary.
+
+Ingestion stores every distinct description of an entity in e.descriptions
+without calling the LLM. This pass runs afterwards (main.py --consolidate, or
+on its own) and summarizes only the entities whose list has grown past a
+threshold, writing the summaries back in batches:
+    python consolidate.py --min-descriptions 3 --concurrency 8
+"""
+import time
+import argparse
+from config import (USE_OPENAI, LLM_CONCURRENCY, LLM_RPM, LLM_TPM, CONSOLIDATE_MIN_DESCRIPTIONS,
+                    CONSOLIDATE_BATCH_SIZE)
+from extractor import summarize_entity_descriptions
+from stage_timer import TIMER
+
+
+def _summaries(groups, model, cache, concurrency, rpm, tpm):
+    """Yield the summary (or the exception) of each (name, type, descriptions) group, in order"""
+    items = [(name, descriptions) for name, _, descriptions in groups]
+    if not USE_OPENAI:
+        # Without an LLM the distinct descriptions are simply joined
+        for _, descriptions in items:
+            yield "; ".join(descriptions)
+    elif concurrency > 1:
+        from async_extractor import AsyncExtractionEngine
+        engine = AsyncExtractionEngine(model=model, max_concurrency=concurrency, rpm=rpm, tpm=tpm, cache=cache)
+        for _, result in engine.extract_in_order(items, fn=engine.summarize):
+            yield result
+    else:
+        for name, descriptions in items:
+            try:
+                yield summarize_entity_descriptions(name, descriptions, model, cache)
+            except Exception as e:
+                yield e
+
+
+def consolidate_entity_descriptions(client, min_descriptions=CONSOLIDATE_MIN_DESCRIPTIONS, model="gpt-4o-mini",
+                                    cache=None, concurrency=LLM_CONCURRENCY, rpm=LLM_RPM, tpm=LLM_TPM,
+                                    batch_size=CONSOLIDATE_BATCH_SIZE) -> dict:
+    """Summarize entities with at least min_descriptions descriptions and write the summaries in bulk"""
+    # Read all candidates before writing so the stream does not see its own updates
+    groups = [
+        (row["name"], row["type"], sorted(set(row["descriptions"])))
+        for row in client.iter_entities_to_consolidate(min_descriptions)
+    ]
+    stats = {"candidates": len(groups), "summarized": 0, "failed": 0}
+    rows = []
+    for (name, entity_type, descriptions), summary in zip(groups, _summaries(groups, model, cache, concurrency,
+                                                                              rpm, tpm)):
+        if isinstance(summary, Exception) or not summary.strip():
+            print(f"[Consolidate] Failed to summarize {name} ({entity_type}): {summary!r}")
+            stats["failed"] += 1
+            continue
+        rows.append({"name": name, "type": entity_type, "summary": summary.strip(), "consumed": descriptions})
+        if len(rows) >= batch_size:
+            with TIMER.time("consolidate_write"):
+                client.set_entity_summaries(rows)
+            stats["summarized"] += len(rows)
+            rows = []
+    if rows:
+        with TIMER.time("consolidate_write"):
+            client.set_entity_summaries(rows)
+        stats["summarized"] += len(rows)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize entities with many accumulated descriptions")
+    parser.add_argument("--min-descriptions", type=int, default=CONSOLIDATE_MIN_DESCRIPTIONS,
+                        help=f"Summarize entities with at least this many descriptions "
+                             f"(default: {CONSOLIDATE_MIN_DESCRIPTIONS})")
+    parser.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY,
+                        help=f"Concurrent LLM requests (default: {LLM_CONCURRENCY})")
+    parser.add_argument("--batch-size", type=int, default=CONSOLIDATE_BATCH_SIZE,
+                        help=f"Summaries per bulk write (default: {CONSOLIDATE_BATCH_SIZE})")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Disable the on-disk LLM response cache")
+    args = parser.parse_args()
+
+    from neo4j_client import Neo4jClient
+    cache = None
+    if USE_OPENAI and not args.no_llm_cache:
+        from llm_cache import LLMResponseCache
+        cache = LLMResponseCache()
+    client = Neo4jClient()
+    start = time.time()
+    try:
+        stats = consolidate_entity_descriptions(client, args.min_descriptions, cache=cache,
+                                                concurrency=args.concurrency, batch_size=args.batch_size)
+    finally:
+        client.close()
+        if cache is not None:
+            cache.close()
+    print(f"Consolidated {stats['summarized']}/{stats['candidates']} entities "
+          f"({stats['failed']} failed) in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# dedup.py
+import re
+import random
+import hashlib
+from collections import defaultdict
+from typing import List, Dict
+
+_PUNCT_RE = re.compile(r"\s*([.,;:!?])\s*")
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_report(text: str) -> str:
+    """Lowercase and canonicalize whitespace and punctuation spacing"""
+    text = _PUNCT_RE.sub(r"\1 ", text.lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def report_fingerprint(text: str) -> str:
+    """Hash of the normalized report; equal fingerprints mean the extraction input is the same"""
+    return hashlib.sha1(normalize_report(text).encode("utf-8")).hexdigest()
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Word n-grams of the normalized report"""
+    words = _WORD_RE.findall(normalize_report(text))
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHashLSH:
+    """MinHash signatures bucketed by bands, for finding near-duplicate reports"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(_MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+
+    def signature(self, shingle_set: set) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+                  for s in shingle_set]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.permutations]
+
+    def _bands(self, signature: List[int]):
+        for band, buckets in enumerate(self.buckets):
+            yield buckets, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def query(self, signature: List[int]) -> set:
+        """Keys sharing at least one band with the signature"""
+        candidates = set()
+        for buckets, band in self._bands(signature):
+            candidates.update(buckets.get(band, ()))
+        return candidates
+
+    def insert(self, key, signature: List[int]):
+        for buckets, band in self._bands(signature):
+            buckets[band].append(key)
+
+
+def cluster_reports(texts: List[str], near_duplicates: bool = False, threshold: float = 0.9) -> List[int]:
+    """Map each report to the index of its cluster's representative, the first report of the cluster.
+
+    Exact clusters share a normalized-text fingerprint. With near_duplicates,
+    a new report also joins an earlier representative whose word-shingle
+    Jaccard similarity is at least threshold; LSH keeps the comparisons to
+    candidates only.
+    """
+    representatives, by_fingerprint = [], {}
+    lsh = MinHashLSH() if near_duplicates else None
+    rep_shingles = {}
+    for idx, text in enumerate(texts):
+        fingerprint = report_fingerprint(text)
+        if fingerprint in by_fingerprint:
+            representatives.append(by_fingerprint[fingerprint])
+            continue
+        rep = idx
+        if lsh is not None:
+            doc_shingles = shingles(text)
+            signature = lsh.signature(doc_shingles)
+            candidates = lsh.query(signature)
+            best = max(candidates, key=lambda c: jaccard(doc_shingles, rep_shingles[c]), default=None)
+            if best is not None and jaccard(doc_shingles, rep_shingles[best]) >= threshold:
+                rep = best
+            else:
+                rep_shingles[idx] = doc_shingles
+                lsh.insert(idx, signature)
+        by_fingerprint[fingerprint] = rep
+        representatives.append(rep)
+    return representatives
+
+
+def dedup_stats(representatives: List[int]) -> Dict:
+    """Documents, unique clusters and the extraction calls avoided"""
+    documents = len(representatives)
+    unique = len(set(representatives))
+    return {
+        "documents": documents,
+        "unique": unique,
+        "dedup_ratio": 1 - unique / documents if documents else 0.0,
+        "extractions_saved": documents - unique,
+    }
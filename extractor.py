@@ -1,83 +1,502 @@
 # extractor.py
-import os
 import re
-import importlib.util
+import time
+import functools
 from typing import List, Dict
-from config import TUPLE_DELIM, RECORD_DELIM, COMPLETION_DELIM, USE_OPENAI, OPENAI_API_KEY
-
-# === Load prompt file ===
-PROMPT_MODULE_PATH = os.path.join(os.path.dirname(__file__), "prompt_iuxray.py")
-spec = importlib.util.spec_from_file_location("prompt_iuxray", PROMPT_MODULE_PATH)
-prompt_mm = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(prompt_mm)
-PROMPTS = getattr(prompt_mm, "PROMPTS", {})
+from config import (TUPLE_DELIM, RECORD_DELIM, COMPLETION_DELIM, GRAPH_FIELD_SEP, USE_OPENAI, OPENAI_API_KEY,
+                    OPENAI_API_BASE, GLEAN_MAX_PASSES, GLEAN_MIN_TOKENS, GLEAN_TIME_BUDGET, GLEAN_TOKEN_BUDGET)
+from prompt_registry import PROMPT_REGISTRY
+from stage_timer import TIMER
 
 # OpenAI
 if USE_OPENAI:
     import openai
     openai.api_key = OPENAI_API_KEY
+    if OPENAI_API_BASE:
+        # e.g. a local OpenAI-compatible stand-in for offline testing
+        openai.api_base = OPENAI_API_BASE
+
+# Packed extraction: expected completion tokens per input token of a report
+PACK_OUTPUT_RATIO = 2.0
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting"""
+    return max(1, len(text) // 4)
+
+# Records separated by a line break instead of the record delimiter: ")" newline "(".
+# The split pattern keeps the parentheses; the search pattern starts with a literal and scans fast.
+_LINE_RECORD_RE = re.compile(r"(?<=\))[ \t]*\r?\n\s*(?=\()")
+_LINE_RECORD_SEARCH_RE = re.compile(r"\)[ \t]*\r?\n\s*\(")
+_PAREN_RE = re.compile(r"[()]")
+_NUMBER_RE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+# Qualitative strengths mapped onto the 1-10 scale used for numeric ones
+_STRENGTH_WORDS = {"strong": 9.0, "high": 9.0, "moderate": 5.0, "medium": 5.0, "weak": 2.0, "low": 2.0}
+# Record tags as the model usually writes them; anything else is unquoted and lower-cased
+_TAGS = {f"{quote}{name}{quote}": tag for quote in ("", '"')
+         for tag in ("entity", "relationship", "document") for name in (tag, tag.capitalize(), tag.upper())}
+
+def _unquote(field: str) -> str:
+    """Strip whitespace and the enclosing quotes, or an unpaired quote at either end; inner quotes are kept"""
+    field = field.strip()
+    if field[:1] == '"':
+        if len(field) > 1 and field[-1] == '"':
+            return field[1:-1].strip()
+        if field.count('"') % 2:
+            return field[1:].strip()
+    elif field[-1:] == '"' and field.count('"') % 2:
+        return field[:-1].strip()
+    return field
+
+def _join_quoted(parts: List[str]) -> List[str]:
+    """Rejoin fields that were split at a tuple delimiter inside quotes.
+
+    A field with an odd number of quotes opens a quoted span that the next
+    such field closes. An unterminated span is left split.
+    """
+    fields, span = [], None
+    for part in parts:
+        odd = part.count('"') % 2
+        if span is not None:
+            span.append(part)
+            if odd:
+                fields.append(TUPLE_DELIM.join(span))
+                span = None
+        elif odd:
+            span = [part]
+        else:
+            fields.append(part)
+    if span is not None:
+        fields.extend(span)
+    return fields
+
+def _first_glued_record(rec: str, fields: List[str], count: int) -> List[str]:
+    """Fields of the first of several records written back to back without a delimiter.
 
-def parse_entity_extraction_output(raw: str) -> Dict:
-    """Parse the raw LLM output into structured entities and relationships"""
-    records = [r.strip() for r in raw.split(RECORD_DELIM) if r.strip()]
-    entities, relationships = [], []
+    The record ends at the parenthesis that closes its first "(". If the
+    parentheses do not balance into a record of count fields, fields is kept.
+    """
+    start, depth = rec.find("("), 0
+    if start == -1:
+        return fields
+    for match in _PAREN_RE.finditer(rec, start):
+        depth += 1 if match.group() == "(" else -1
+        if depth == 0:
+            first = _join_quoted(rec[start + 1:match.start()].split(TUPLE_DELIM))
+            return first if len(first) >= count else fields
+    return fields
+
+@functools.lru_cache(maxsize=65536)
+def normalize_entity_name(name: str) -> str:
+    """Canonical entity name: unquoted, single-spaced, upper case"""
+    return " ".join(name.strip("\"'* ").split()).upper()
+
+@functools.lru_cache(maxsize=4096)
+def normalize_entity_type(entity_type: str) -> str:
+    """Canonical entity type: unquoted, lower case"""
+    return _unquote(entity_type).lower()
+
+@functools.lru_cache(maxsize=4096)
+def parse_strength(text: str) -> float:
+    """Numeric relationship strength from text such as 8, 0.7 (likely) or strong"""
+    match = _NUMBER_RE.search(text)
+    if match:
+        return float(match.group())
+    words = text.lower().split()
+    return _STRENGTH_WORDS.get(words[0].strip(".,;:\"'") if words else "", 0.0)
+
+def _parse_records(text: str) -> List[tuple]:
+    """Tokenize extraction output that has no completion delimiter into typed (tag, value) records.
+
+    A record's fields are the text between its first "(" and last ")", so
+    parentheses inside descriptions are kept, split on the tuple delimiter
+    except inside quotes. Fields lose their enclosing quotes only.
+    """
+    records = text.split(RECORD_DELIM)
+    if _LINE_RECORD_SEARCH_RE.search(text) is not None:
+        records = [part for rec in records for part in _LINE_RECORD_RE.split(rec)]
+    parsed = []
+    append = parsed.append
     for rec in records:
-        parts = [p.strip().strip('"') for p in rec.strip().strip("() ").split(TUPLE_DELIM)]
-        if not parts: 
+        rec = rec.strip()
+        if not rec:
             continue
-        tag = parts[0].lower()
-        if tag == "entity" and len(parts) >= 4:
-            entities.append({
-                "name": parts[1],
-                "type": parts[2],
-                "description": parts[3]
-            })
-        elif tag == "relationship" and len(parts) >= 5:
-            relationships.append({
-                "source": parts[1],
-                "target": parts[2],
-                "description": parts[3],
-                "strength": parts[4]
-            })
-    return {"entities": entities, "relationships": relationships}
-
-def call_llm_entity_extraction(text: str, entity_types: List[str]=None, model="gpt-4o-mini"):
-    """Call LLM for entity extraction using the provided prompt"""
-    template = PROMPTS.get("entity_extraction")
-    if not template:
-        raise RuntimeError("entity_extraction prompt not found in prompt_iuxray.py")
-
-    entity_types = entity_types or PROMPTS.get("DEFAULT_ENTITY_TYPES", [])
-    prompt = template.format(
-        entity_types=",".join(entity_types),
-        input_text=text,
-        tuple_delimiter=TUPLE_DELIM,
-        record_delimiter=RECORD_DELIM,
-        completion_delimiter=COMPLETION_DELIM
-    )
-
-    resp = openai.ChatCompletion.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are a structured information extractor."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0
-    )
-    raw = resp["choices"][0]["message"]["content"]
+        if rec[0] == "(" and rec[-1] == ")":
+            body = rec[1:-1]
+        else:
+            # Prose before the record ("Here are the records:\n(...") or after it ("```")
+            head = rec.find(TUPLE_DELIM)
+            start = rec.find("(", 0, head if head != -1 else len(rec))
+            body = rec
+            if start != -1:
+                end = rec.rfind(")")
+                body = rec[start + 1:end] if end > start else rec[start + 1:]
+        fields = body.split(TUPLE_DELIM)
+        # Only quotes after the tag can hide a tuple delimiter; most records have none
+        if body.find('"', len(fields[0])) == -1:
+            field = str.strip
+        else:
+            fields = _join_quoted(fields)
+            field = _unquote
+
+        tag = _TAGS.get(fields[0]) or _unquote(fields[0]).lower()
+        if tag == "entity" and len(fields) >= 4:
+            if len(fields) > 4:
+                fields, field = _first_glued_record(rec, fields, 4), _unquote
+            name = normalize_entity_name(fields[1])
+            if name:
+                append(("entity", {
+                    "name": name,
+                    "type": normalize_entity_type(fields[2]),
+                    "description": field(fields[3])
+                }))
+        elif tag == "relationship" and len(fields) >= 5:
+            if len(fields) > 5:
+                fields, field = _first_glued_record(rec, fields, 5), _unquote
+            source, target = normalize_entity_name(fields[1]), normalize_entity_name(fields[2])
+            if source and target:
+                append(("relationship", {
+                    "source": source,
+                    "target": target,
+                    "description": field(fields[3]),
+                    "strength": parse_strength(fields[4])
+                }))
+        elif tag == "document" and len(fields) >= 2:
+            doc_id = _unquote(fields[1])
+            if doc_id:
+                append(("document", doc_id))
+    return parsed
+
+def _collect_records(records, packed: bool=False) -> Dict:
+    """Group typed records into entities and relationships, merging repeated entities into their first mention"""
+    current = {"entities": [], "relationships": []}
+    entities, relationships, seen = current["entities"], current["relationships"], {}
+    documents, seen_by_doc = {}, {}
+    for tag, value in records:
+        if tag == "entity":
+            key = (value["name"], value["type"])
+            first = seen.get(key)
+            description = value["description"]
+            if first is None:
+                # The distinct descriptions of an entity, merged into the first mention
+                seen[key] = (value, {description})
+                entities.append(value)
+            elif description not in first[1]:
+                first[1].add(description)
+                if description:
+                    first[0]["description"] = "; ".join(filter(None, [first[0]["description"], description]))
+        elif tag == "relationship":
+            relationships.append(value)
+        elif packed:
+            current = documents.setdefault(value, {"entities": [], "relationships": []})
+            entities, relationships = current["entities"], current["relationships"]
+            seen = seen_by_doc.setdefault(value, {})
+    return documents if packed else current
+
+def parse_entity_extraction_output(raw: str, packed: bool=False) -> Dict:
+    """Parse the raw LLM output into structured entities and relationships.
+
+    Entities repeated within a document are deduplicated and relationship
+    strengths are numeric. With packed=True the output of a multi-report
+    prompt is demultiplexed by its ("document"<|>DOC_ID) records into
+    {doc_id: parsed}.
+    """
+    completion = raw.find(COMPLETION_DELIM)
+    if completion != -1:
+        raw = raw[:completion]
+    return _collect_records(_parse_records(raw), packed)
+
+def merge_repeated_entities(parsed: Dict) -> Dict:
+    """Merge the repeated entities of streamed records the way parse_entity_extraction_output does"""
+    records = [("entity", dict(entity)) for entity in parsed["entities"]]
+    records += [("relationship", rel) for rel in parsed["relationships"]]
+    return _collect_records(records)
+
+class IncrementalRecordParser:
+    """Parse records out of a streamed completion as soon as their delimiter arrives.
+
+    Repeated entities are returned too, so each of their descriptions reaches
+    the graph; merge_repeated_entities turns what was written into what
+    parse_entity_extraction_output returns for the whole completion.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+
+    def feed(self, chunk: str) -> List[tuple]:
+        """Consume a chunk of output and return the (tag, value) records it completed"""
+        if self.done:
+            return []
+        self.buffer += chunk
+        completion = self.buffer.find(COMPLETION_DELIM)
+        if completion != -1:
+            self.buffer = self.buffer[:completion]
+            self.done = True
+            return self._split(final=True)
+        return self._split(final=False)
+
+    def close(self) -> List[tuple]:
+        """Flush the trailing record of a stream that ended without the completion delimiter"""
+        if self.done:
+            return []
+        self.done = True
+        return self._split(final=True)
+
+    def _split(self, final: bool) -> List[tuple]:
+        if final:
+            text, self.buffer = self.buffer, ""
+        else:
+            # Split the way the whole completion would be, so a chunk ending inside "##" changes nothing
+            rest = self.buffer.split(RECORD_DELIM)[-1]
+            cut = len(self.buffer) - len(rest) - len(RECORD_DELIM)
+            if cut < 0:
+                return []
+            text, self.buffer = self.buffer[:cut], rest
+        return _parse_records(text)
+
+def _extraction_static_fields(entity_types: List[str]=None) -> Dict:
+    """Prompt fields that stay the same for every report"""
+    entity_types = entity_types or PROMPT_REGISTRY.get("DEFAULT_ENTITY_TYPES", [])
+    return {"entity_types": ",".join(entity_types)}
+
+def build_entity_extraction_prompt(text: str, entity_types: List[str]=None) -> str:
+    """Render the entity_extraction prompt for a report; the invariant instructions come first"""
+    return PROMPT_REGISTRY.render("entity_extraction", static=_extraction_static_fields(entity_types),
+                                  input_text=text)
+
+def build_packed_extraction_prompt(items: List[tuple], entity_types: List[str]=None) -> str:
+    """Render the entity_extraction_packed prompt for several (doc_id, text) reports"""
+    reports = "\n\n".join(f"[DOC {doc_id}]\n{text}" for doc_id, text in items)
+    return PROMPT_REGISTRY.render("entity_extraction_packed", static=_extraction_static_fields(entity_types),
+                                  input_text=reports)
+
+def build_extraction_messages(prompt: str) -> List[Dict]:
+    """Wrap a rendered extraction prompt into chat messages"""
+    return [
+        {"role": "system", "content": "You are a structured information extractor."},
+        {"role": "user", "content": prompt}
+    ]
+
+def build_summary_messages(entity_name: str, descriptions: List[str]) -> List[Dict]:
+    """Chat messages asking to merge an entity's accumulated descriptions into one"""
+    prompt = PROMPT_REGISTRY.render("summarize_entity_descriptions", entity_name=entity_name,
+                                    description_list=GRAPH_FIELD_SEP.join(descriptions))
+    return [{"role": "user", "content": prompt}]
+
+def record_llm_usage(resp):
+    """Count a completed request and its token usage in the stage timer"""
+    usage = resp.get("usage") or {}
+    TIMER.count("llm_requests")
+    TIMER.count("prompt_tokens", usage.get("prompt_tokens", 0))
+    TIMER.count("completion_tokens", usage.get("completion_tokens", 0))
+
+def _chat_completion(messages: List[Dict], model: str, cache=None, **params) -> str:
+    """Run a chat completion, optionally through an LLMResponseCache, and return the message content"""
+    raw = cache.get(model, messages, params) if cache is not None else None
+    if raw is None:
+        start = time.perf_counter()
+        with TIMER.time("llm"):
+            resp = openai.ChatCompletion.create(
+                model=model,
+                messages=messages,
+                **params
+            )
+        record_llm_usage(resp)
+        raw = resp["choices"][0]["message"]["content"]
+        if cache is not None:
+            cache.put(model, messages, params, raw, time.perf_counter() - start)
+    return raw
+
+def call_llm_entity_extraction(text: str, entity_types: List[str]=None, model="gpt-4o-mini", cache=None):
+    """Call LLM for entity extraction using the provided prompt, optionally through an LLMResponseCache"""
+    prompt = build_entity_extraction_prompt(text, entity_types)
+    raw = _chat_completion(build_extraction_messages(prompt), model, cache, temperature=0)
     raw = raw.split(COMPLETION_DELIM)[0]
     return raw
 
-def spacy_fallback_extract(text: str):
-    """Fallback extractor using spaCy NER (no relationships)"""
+def should_glean(text: str, min_tokens: int=GLEAN_MIN_TOKENS) -> bool:
+    """Only reports long enough to hold more findings than one pass returns are gleaned"""
+    return estimate_tokens(text) >= min_tokens
+
+def gleaning_conversation(text: str, entity_types: List[str]=None, max_gleanings: int=GLEAN_MAX_PASSES,
+                          time_budget: float=GLEAN_TIME_BUDGET, token_budget: int=GLEAN_TOKEN_BUDGET,
+                          min_tokens: int=GLEAN_MIN_TOKENS):
+    """Drive an extraction with gleaning passes, independent of how completions are obtained.
+
+    Yields (messages, params) requests and expects each completion back via
+    send(); the combined raw output is the generator's return value. The
+    conversation only ever grows at the end, so every follow-up request shares
+    the previous one as a prefix and the provider's prompt cache serves it.
+    Gleaning stops when the YES/NO check answers NO, a pass adds nothing, or
+    the pass, time or token budget (tokens newly sent or generated) runs out.
+    """
+    messages = build_extraction_messages(build_entity_extraction_prompt(text, entity_types))
+    raw = (yield messages, {"temperature": 0}).split(COMPLETION_DELIM)[0]
+    outputs = [raw]
+    if max_gleanings <= 0 or not should_glean(text, min_tokens):
+        return raw
+
+    continue_prompt = PROMPT_REGISTRY.get("entity_continue_extraction")
+    if_loop_prompt = PROMPT_REGISTRY.get("entity_if_loop_extraction")
+    start, used_tokens = time.perf_counter(), 0
+    for gleaning in range(max_gleanings):
+        messages = messages + [{"role": "assistant", "content": raw},
+                               {"role": "user", "content": continue_prompt}]
+        raw = (yield messages, {"temperature": 0}).split(COMPLETION_DELIM)[0]
+        used_tokens += estimate_tokens(continue_prompt) + estimate_tokens(raw)
+        if not raw.strip():
+            break
+        outputs.append(raw)
+        if (gleaning == max_gleanings - 1 or time.perf_counter() - start > time_budget
+                or used_tokens > token_budget):
+            break
+        check = messages + [{"role": "assistant", "content": raw},
+                            {"role": "user", "content": if_loop_prompt}]
+        answer = yield check, {"temperature": 0, "max_tokens": 1}
+        used_tokens += estimate_tokens(if_loop_prompt) + 1
+        if answer.strip().strip('"\'.').upper() != "YES":
+            break
+    return RECORD_DELIM.join(outputs)
+
+def call_llm_entity_extraction_gleaning(text: str, entity_types: List[str]=None, model="gpt-4o-mini", cache=None,
+                                        max_gleanings: int=GLEAN_MAX_PASSES, **budget):
+    """Call LLM for entity extraction followed by budgeted gleaning passes; see gleaning_conversation"""
+    steps = gleaning_conversation(text, entity_types, max_gleanings, **budget)
+    messages, params = next(steps)
+    try:
+        while True:
+            messages, params = steps.send(_chat_completion(messages, model, cache, **params))
+    except StopIteration as stop:
+        return stop.value
+
+def stream_llm_entity_extraction(text: str, entity_types: List[str]=None, model="gpt-4o-mini",
+                                 max_records: int=None, cache=None):
+    """Stream (tag, value) records of an extraction while the completion is being generated.
+
+    Generation stops at the completion delimiter or, when max_records is set,
+    as soon as that many records have been emitted. Complete responses are
+    stored in the cache and replayed from it on later runs.
+    """
+    prompt = build_entity_extraction_prompt(text, entity_types)
+    messages = build_extraction_messages(prompt)
+    params = {"temperature": 0}
+    parser = IncrementalRecordParser()
+
+    cached = cache.get(model, messages, params) if cache is not None else None
+    if cached is not None:
+        chunks = [cached]
+    else:
+        chunks = (
+            chunk["choices"][0]["delta"].get("content", "")
+            for chunk in openai.ChatCompletion.create(model=model, messages=messages, stream=True, **params)
+        )
+
+    start = time.perf_counter()
+    output, emitted = [], 0
+    # Time spent parsing chunks and in the consumer, both kept out of llm_stream
+    parse_seconds = consumer_seconds = 0.0
+    try:
+        for chunk in chunks:
+            output.append(chunk)
+            parse_start = time.perf_counter()
+            records = parser.feed(chunk)
+            parse_seconds += time.perf_counter() - parse_start
+            for record in records:
+                consumer_start = time.perf_counter()
+                yield record
+                consumer_seconds += time.perf_counter() - consumer_start
+                emitted += 1
+                if max_records is not None and emitted >= max_records:
+                    return
+            if parser.done:
+                break
+        parse_start = time.perf_counter()
+        records = parser.close()
+        parse_seconds += time.perf_counter() - parse_start
+        for record in records:
+            yield record
+    finally:
+        # One parse sample per report, summed over its chunks
+        TIMER.add("parse", parse_seconds)
+        if cached is None:
+            # Streamed responses carry no usage, so their tokens are estimated
+            TIMER.add("llm_stream", time.perf_counter() - start - parse_seconds - consumer_seconds)
+            record_llm_usage({"usage": {
+                "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+                "completion_tokens": estimate_tokens("".join(output)),
+            }})
+
+    if cache is not None and cached is None:
+        cache.put(model, messages, params, "".join(output), time.perf_counter() - start)
+
+def summarize_entity_descriptions(entity_name: str, descriptions: List[str], model="gpt-4o-mini", cache=None,
+                                  max_tokens: int=512) -> str:
+    """Call LLM to merge an entity's descriptions, optionally through an LLMResponseCache"""
+    return _chat_completion(build_summary_messages(entity_name, descriptions), model, cache,
+                            temperature=0, max_tokens=max_tokens).strip()
+
+def call_llm_packed_extraction(items: List[tuple], entity_types: List[str]=None, model="gpt-4o-mini", cache=None):
+    """Call LLM once for several (doc_id, text) reports and return the raw packed output"""
+    prompt = build_packed_extraction_prompt(items, entity_types)
+    raw = _chat_completion(build_extraction_messages(prompt), model, cache, temperature=0)
+    return raw.split(COMPLETION_DELIM)[0]
+
+def pack_reports(items: List[tuple], token_budget: int, max_pack: int=16) -> List[List[tuple]]:
+    """Greedily group (doc_id, text) reports so each pack's report and expected output tokens fit the budget"""
+    packs, current, used = [], [], 0
+    for doc_id, text in items:
+        cost = int(estimate_tokens(text) * (1 + PACK_OUTPUT_RATIO))
+        if current and (used + cost > token_budget or len(current) >= max_pack):
+            packs.append(current)
+            current, used = [], 0
+        current.append((doc_id, text))
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+def iter_packed_extraction(items: List[tuple], token_budget: int, max_pack: int=16,
+                           entity_types: List[str]=None, model="gpt-4o-mini", cache=None):
+    """Yield (doc_id, parsed or exception) in input order, extracting several reports per LLM call.
+
+    Reports missing from a pack's output, and every report of a pack whose
+    call failed, are re-extracted one at a time.
+    """
+    for pack in pack_reports(items, token_budget, max_pack):
+        documents = {}
+        if len(pack) > 1:
+            try:
+                raw = call_llm_packed_extraction(pack, entity_types, model, cache)
+                with TIMER.time("parse"):
+                    documents = parse_entity_extraction_output(raw, packed=True)
+            except Exception as e:
+                print(f"Packed extraction of {len(pack)} reports failed, falling back:", e)
+        for doc_id, text in pack:
+            parsed = documents.get(doc_id)
+            if not parsed or not parsed["entities"]:
+                try:
+                    raw = call_llm_entity_extraction(text, entity_types, model, cache)
+                    with TIMER.time("parse"):
+                        parsed = parse_entity_extraction_output(raw)
+                except Exception as e:
+                    parsed = e
+            yield doc_id, parsed
+
+# Pipeline components not needed for NER with en_core_web_sm
+SPACY_DISABLED_COMPONENTS = ["tagger", "parser", "attribute_ruler", "lemmatizer"]
+
+@functools.lru_cache(maxsize=None)
+def get_spacy_nlp(model: str="en_core_web_sm"):
+    """Load the spaCy pipeline once per process, with only the components NER needs"""
     import spacy
     try:
-        nlp = spacy.load("en_core_web_sm")
-    except Exception:
+        return spacy.load(model, exclude=SPACY_DISABLED_COMPONENTS)
+    except OSError:
         import subprocess
-        subprocess.run(["python","-m","spacy","download","en_core_web_sm"], check=True)
-        nlp = spacy.load("en_core_web_sm")
-    doc = nlp(text)
+        subprocess.run(["python","-m","spacy","download",model], check=True)
+        return spacy.load(model, exclude=SPACY_DISABLED_COMPONENTS)
+
+def _spacy_doc_to_parsed(doc) -> Dict:
     ents = []
     for e in doc.ents:
         ents.append({
@@ -85,4 +504,13 @@ def spacy_fallback_extract(text: str):
             "type": e.label_.lower(),
             "description": f"spaCy label={e.label_}"
         })
-    return {"entities": ents, "relationships": []}
\ No newline at end of file
+    return {"entities": ents, "relationships": []}
+
+def spacy_fallback_extract(text: str):
+    """Fallback extractor using spaCy NER (no relationships)"""
+    return _spacy_doc_to_parsed(get_spacy_nlp()(text))
+
+def spacy_fallback_extract_batch(texts, batch_size: int=64, n_process: int=1):
+    """Yield fallback extractions for many texts in order, batched through nlp.pipe"""
+    for doc in get_spacy_nlp().pipe(texts, batch_size=batch_size, n_process=n_process):
+        yield _spacy_doc_to_parsed(doc)
@@ -0,0 +1,245 @@
+# graph_sink.py
+"""Destinations for the graph built by main.py: Neo4j, local snapshot files, or nowhere.
+
+A snapshot directory can be bulk-loaded into Neo4j later:
+    python graph_sink.py graph_snapshot
+"""
+import os
+import glob
+import json
+import argparse
+import threading
+
+# Snapshot tables in the order they must be loaded
+SNAPSHOT_TABLES = ["documents", "entities", "relationships", "entity_embeddings", "images", "links"]
+
+
+class NullSink:
+    """Accepts the Neo4jClient write calls and discards them, to time the compute stages alone"""
+
+    def create_document_subgraph(self, doc_id, doc_text, entities, relationships):
+        pass
+
+    def write_document_records(self, doc_id, doc_text, records):
+        written = {"entities": [], "relationships": []}
+        for tag, value in records:
+            if tag == "entity":
+                written["entities"].append(value)
+            elif tag == "relationship":
+                written["relationships"].append(value)
+        return written
+
+    def set_entity_embeddings(self, entities, embeddings):
+        pass
+
+    def create_image_node(self, image_path, feature_vector, doc_id):
+        pass
+
+    def link_entity_to_image(self, entity_name, entity_type, image_path, similarity):
+        pass
+
+    def create_constraints(self):
+        pass
+
+    def create_entity_vector_index(self, *args, **kwargs):
+        pass
+
+    def clear_all(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _JsonlWriter:
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, rows):
+        self.file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    """Buffers rows and appends them to a Parquet file as row groups"""
+
+    def __init__(self, path, row_group_size=1000):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.row_group_size = row_group_size
+        self.buffer = []
+        self.writer = None
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        table = self.pa.Table.from_pylist(self.buffer)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+        self.buffer = []
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class FileSink(NullSink):
+    """Writes the nodes and edges main.py would send to Neo4j as one JSONL or Parquet file per table.
+
+    Worker processes pass their shard number so each appends to its own files.
+    """
+
+    def __init__(self, directory="graph_snapshot", fmt="jsonl", shard=None):
+        self.directory = directory
+        self.fmt = fmt
+        self.shard = shard
+        self._writers = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, table):
+        suffix = f".{self.shard}" if self.shard is not None else ""
+        path = os.path.join(self.directory, f"{table}{suffix}.{self.fmt}")
+        # Parquet files cannot be appended to, so a later (e.g. resumed) run adds a new part
+        part = 1
+        while self.fmt == "parquet" and os.path.exists(path):
+            path = os.path.join(self.directory, f"{table}{suffix}.part{part}.{self.fmt}")
+            part += 1
+        return path
+
+    def _write(self, table, rows):
+        if not rows:
+            return
+        with self._lock:
+            writer = self._writers.get(table)
+            if writer is None:
+                path = self._path(table)
+                writer = _ParquetWriter(path) if self.fmt == "parquet" else _JsonlWriter(path)
+                self._writers[table] = writer
+            writer.write(rows)
+
+    def create_document_subgraph(self, doc_id, doc_text, entities, relationships):
+        self._write("documents", [{"doc_id": doc_id, "text": doc_text}])
+        self._write("entities", [_entity_row(doc_id, ent) for ent in entities])
+        self._write("relationships", [_relationship_row(rel) for rel in relationships])
+
+    def write_document_records(self, doc_id, doc_text, records):
+        written = super().write_document_records(doc_id, doc_text, records)
+        self.create_document_subgraph(doc_id, doc_text, written["entities"], written["relationships"])
+        return written
+
+    def set_entity_embeddings(self, entities, embeddings):
+        self._write("entity_embeddings", [
+            {"name": ent["name"], "type": ent.get("type", "UNKNOWN"), "embedding": emb}
+            for ent, emb in zip(entities, embeddings) if emb is not None
+        ])
+
+    def create_image_node(self, image_path, feature_vector, doc_id):
+        self._write("images", [{"path": image_path, "feature_vector": feature_vector, "doc_id": doc_id}])
+
+    def link_entity_to_image(self, entity_name, entity_type, image_path, similarity):
+        self._write("links", [{"name": entity_name, "type": entity_type, "path": image_path,
+                               "similarity": similarity}])
+
+    def clear_all(self):
+        """Delete every snapshot file in the directory, of all shards"""
+        with self._lock:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = {}
+            for path in glob.glob(os.path.join(glob.escape(self.directory), f"*.{self.fmt}")):
+                os.remove(path)
+
+    def close(self):
+        with self._lock:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = {}
+
+
+def _entity_row(doc_id, ent):
+    return {"doc_id": doc_id, "name": ent["name"], "type": ent.get("type", "UNKNOWN"),
+            "description": ent.get("description", "")}
+
+
+def _relationship_row(rel):
+    return {"source": rel["source"], "target": rel["target"], "description": rel.get("description", ""),
+            "strength": rel.get("strength", "")}
+
+
+def open_sink(kind="neo4j", directory="graph_snapshot", fmt="jsonl", shard=None, text_encoder=None):
+    """Return the write target for --sink; Neo4j is only imported when it is used"""
+    if kind == "null":
+        return NullSink()
+    if kind == "file":
+        return FileSink(directory, fmt, shard)
+    from neo4j_client import Neo4jClient
+    return Neo4jClient(text_encoder=text_encoder)
+
+
+def iter_snapshot_rows(directory, table, batch_size=1000):
+    """Yield batches of rows of one table from all shard files of a snapshot"""
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), f"{table}.*"))):
+        if path.endswith(".parquet"):
+            import pyarrow.parquet
+            for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+                yield batch.to_pylist()
+        elif path.endswith(".jsonl"):
+            batch = []
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    batch.append(json.loads(line))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+            if batch:
+                yield batch
+
+
+def load_snapshot(directory, client, batch_size=1000):
+    """Bulk-load a snapshot into Neo4j with one UNWIND query per batch; returns rows per table"""
+    loaded = {}
+    for table in SNAPSHOT_TABLES:
+        loaded[table] = 0
+        for rows in iter_snapshot_rows(directory, table, batch_size):
+            client.write_snapshot_rows(table, rows)
+            loaded[table] += len(rows)
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a graph snapshot written by main.py --sink file")
+    parser.add_argument("directory", nargs="?", default="graph_snapshot")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per UNWIND query (default: 1000)")
+    args = parser.parse_args()
+
+    client = open_sink("neo4j")
+    try:
+        client.create_constraints()
+    except Exception as e:
+        print("Could not create uniqueness constraints:", e)
+    try:
+        client.create_entity_vector_index()
+    except Exception as e:
+        print("Could not create the entity vector index, continuing without semantic entity lookup:", e)
+    try:
+        loaded = load_snapshot(args.directory, client, args.batch_size)
+    finally:
+        client.close()
+    print(", ".join(f"{table}: {n}" for table, n in loaded.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import torchvision.transforms as transforms
 from PIL import Image
 from transformers import CLIPProcessor, CLIPModel, CLIPTokenizer
 import numpy as np
+from stage_timer import TIMER
 
 class ImageProcessor:
     def __init__(self):
@@ -15,10 +16,11 @@ class ImageProcessor:
     def extract_features(self, image_path):
         """Extract feature vector from an image using CLIP"""
         try:
-            image = Image.open(image_path).convert("RGB")
-            inputs = self.processor(images=image, return_tensors="pt").to(self.device)
+            with TIMER.time("image_decode"):
+                image = Image.open(image_path).convert("RGB")
+                inputs = self.processor(images=image, return_tensors="pt").to(self.device)
             
-            with torch.no_grad():
+            with torch.no_grad(), TIMER.time("clip_image_forward"):
                 image_features = self.model.get_image_features(**inputs)
             
             # Normalize feature vector
@@ -42,6 +44,21 @@ class ImageProcessor:
         except Exception as e:
             print(f"Error processing text {text}: {e}")
             return None
+
+    def extract_text_features_batch(self, texts, batch_size=64):
+        """Extract normalized CLIP text features for a list of texts in batches"""
+        features = []
+        for start in range(0, len(texts), batch_size):
+            batch = list(texts[start:start + batch_size])
+            inputs = self.tokenizer(batch, return_tensors="pt", padding=True, truncation=True).to(self.device)
+
+            with torch.no_grad(), TIMER.time("clip_text_forward"):
+                text_features = self.model.get_text_features(**inputs)
+
+            # Normalize feature vectors
+            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+            features.extend(text_features.cpu().numpy().tolist())
+        return features
     
     def calculate_similarity(self, text, image_features):
         """Calculate similarity between text and image features"""
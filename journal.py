@@ -0,0 +1,89 @@
+# journal.py
+import os
+import json
+import time
+import threading
+from config import INGEST_JOURNAL_PATH
+
+# Stages of a document, in the order they commit
+STAGES = ("extracted", "images_embedded", "graph_written", "links_written")
+
+
+class IngestJournal:
+    """Append-only JSONL record of which ingestion stages each document has committed.
+
+    A stage is recorded only after its work is durable (in the graph, or in the
+    journal itself for extraction results and image features), so losing the
+    last unflushed batch in a crash only means redoing those idempotent steps.
+    Lines are buffered and written with one fsync per batch.
+    """
+
+    def __init__(self, path=INGEST_JOURNAL_PATH, resume=False, flush_every=100, flush_interval=2.0,
+                 read_paths=None):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        # doc_id -> {stage: data}
+        self.state = {}
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        if resume:
+            # Journals of other worker shards are read but only this one is appended to
+            for read_path in read_paths or [path]:
+                if os.path.exists(read_path):
+                    self._load(read_path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self, path):
+        intact = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                intact += len(line)
+                self.state.setdefault(entry["doc_id"], {})[entry["stage"]] = entry.get("data")
+        # Drop a line cut short by a crash so appended entries start on a fresh line
+        if path == self.path:
+            os.truncate(path, intact)
+        # Finished documents no longer need their image features in memory
+        for stages in self.state.values():
+            if "links_written" in stages:
+                stages.pop("images_embedded", None)
+
+    def get(self, doc_id: str, stage: str, fingerprint: str = None):
+        """Data recorded for a committed stage, or None; a changed report fingerprint discards the entry"""
+        stages = self.state.get(doc_id)
+        if not stages or stage not in stages:
+            return None
+        if fingerprint is not None and (stages.get("extracted") or {}).get("fingerprint") != fingerprint:
+            return None
+        return stages[stage] if stages[stage] is not None else {}
+
+    def done(self, doc_id: str, stage: str, fingerprint: str = None) -> bool:
+        return self.get(doc_id, stage, fingerprint) is not None
+
+    def record(self, doc_id: str, stage: str, data=None):
+        line = json.dumps({"doc_id": doc_id, "stage": stage, "data": data}, ensure_ascii=False)
+        with self._lock:
+            self._buffer.append(line)
+            if (len(self._buffer) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
@@ -0,0 +1,121 @@
+# llm_cache.py
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from config import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS, LLM_CACHE_VERSION
+
+
+def prompt_hash(messages) -> str:
+    """Hash the fully rendered chat messages"""
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Persistent SQLite cache of LLM responses keyed by model, prompt hash and sampling parameters.
+
+    Entries expire after `max_age_days`, the least recently used entries are
+    evicted beyond `max_entries`, and bumping `version` (LLM_CACHE_VERSION)
+    invalidates everything written by an earlier prompt or parser revision.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 max_age_days=LLM_CACHE_MAX_AGE_DAYS, version=LLM_CACHE_VERSION):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " model TEXT NOT NULL,"
+            " prompt_hash TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " latency REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " PRIMARY KEY (model, prompt_hash, params, version))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+        self.prune()
+
+    def _key(self, model, messages, params):
+        return model, prompt_hash(messages), json.dumps(params, sort_keys=True), self.version
+
+    def get(self, model, messages, params):
+        """Return the cached response text, or None on a miss"""
+        key = self._key(model, messages, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, latency, created_at FROM responses "
+                "WHERE model=? AND prompt_hash=? AND params=? AND version=?",
+                key
+            ).fetchone()
+            if row is None or (self.max_age and now - row[2] > self.max_age):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access=? "
+                "WHERE model=? AND prompt_hash=? AND params=? AND version=?",
+                (now,) + key
+            )
+            self._conn.commit()
+            self.hits += 1
+            self.time_saved += row[1]
+            return row[0]
+
+    def put(self, model, messages, params, response, latency):
+        """Store a response together with the latency it took to produce"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self._key(model, messages, params) + (response, latency, now, now)
+            )
+            self._conn.commit()
+
+    def prune(self):
+        """Drop expired and stale-version entries, then evict least recently used ones beyond max_entries"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE version != ?", (self.version,))
+            if self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE rowid IN ("
+                    " SELECT rowid FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        """Delete every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counts and the LLM time saved by cache hits"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "time_saved_seconds": self.time_saved,
+        }
+
+    def close(self):
+        """Enforce the size limits and close the database"""
+        self.prune()
+        with self._lock:
+            self._conn.close()
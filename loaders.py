@@ -0,0 +1,178 @@
+# loaders.py
+import os
+import json
+import itertools
+from typing import Iterator, Tuple, List
+
+CHUNK_SIZE = 1 << 16
+_WHITESPACE = " \t\r\n"
+_DECODER = json.JSONDecoder()
+
+
+def iter_report_file(path: str) -> Iterator[str]:
+    """Yield reports from a text file in one pass: blank-line separated blocks, or one report per line.
+
+    The format is known once a blank line is followed by more text; until then the
+    lines of the first block are held back, so a file with no blank lines is only
+    yielded, line by line, when it has been read to the end.
+    """
+    by_block = False
+    block = []
+    blank = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                blank = bool(block)
+                continue
+            if blank:
+                blank = False
+                if block:
+                    by_block = True
+                    yield "\n".join(block)
+                    block = []
+            block.append(line)
+    if by_block:
+        if block:
+            yield "\n".join(block)
+    else:
+        yield from block
+
+
+class _JsonScanner:
+    """Minimal pull scanner over a JSON file read in chunks"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, without consuming it; empty at end of file"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} at offset {self.pos} of the current chunk")
+        self.pos += 1
+
+    def decode(self):
+        """Decode one complete value, reading more of the file until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+                # A number or literal may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def skip(self):
+        """Skip one value without materializing it"""
+        depth, in_string, escaped = 0, False, False
+        self.peek()
+        while True:
+            while self.pos < len(self.buf):
+                char = self.buf[self.pos]
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                        if depth == 0:
+                            self.pos += 1
+                            return
+                elif char == '"':
+                    in_string = True
+                elif char in "[{":
+                    depth += 1
+                elif char in "]}":
+                    if depth == 0:
+                        return
+                    depth -= 1
+                    if depth == 0:
+                        self.pos += 1
+                        return
+                elif char == "," and depth == 0:
+                    return
+                self.pos += 1
+            if not self._fill():
+                return
+
+
+def _iter_json_array_under_key(f, key: str) -> Iterator:
+    """Yield the elements of the array stored under a top-level key, one at a time"""
+    scanner = _JsonScanner(f)
+    scanner.expect("{")
+    while scanner.peek() not in ("}", ""):
+        name = scanner.decode()
+        scanner.expect(":")
+        if name != key:
+            scanner.skip()
+        else:
+            scanner.expect("[")
+            while scanner.peek() != "]":
+                yield scanner.decode()
+                if scanner.peek() == ",":
+                    scanner.pos += 1
+            return
+        if scanner.peek() == ",":
+            scanner.pos += 1
+
+
+def iter_annotation(path: str, split: str = "train") -> Iterator[dict]:
+    """Yield the items of one split of annotation.json without loading the other splits"""
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+    if ijson is not None:
+        with open(path, "rb") as f:
+            yield from ijson.items(f, f"{split}.item")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from _iter_json_array_under_key(f, split)
+
+
+def iter_documents(annotation_file: str, image_dir: str, split: str = "train", text_file: str = None,
+                   offset: int = 0, limit: int = None) -> Iterator[Tuple[str, str, List[str]]]:
+    """Yield (doc_id, text, image_paths) lazily for a slice of a split.
+
+    Report texts come from text_file when given (matched to annotation items by
+    position), otherwise from the annotation's own report field. doc_id is
+    doc_<n> for the n-th item of the split, so slices keep stable ids.
+    """
+    if not os.path.exists(annotation_file):
+        raise FileNotFoundError(f"annotation file {annotation_file} not found; it lists each report's images")
+    annotations = iter_annotation(annotation_file, split)
+    if text_file is not None:
+        # Reports beyond the end of the split have no images
+        pairs = zip(iter_report_file(text_file), itertools.chain(annotations, itertools.repeat(None)))
+    else:
+        pairs = ((item["report"], item) for item in annotations)
+    stop = offset + limit if limit is not None else None
+    for idx, (text, item) in enumerate(itertools.islice(pairs, offset, stop), start=offset):
+        image_paths = [os.path.join(image_dir, p) for p in item["image_path"]] if item else []
+        yield f"doc_{idx+1}", text, image_paths
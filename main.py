@@ -1,10 +1,25 @@
 import os
-import json
+import glob
+import time
+import queue
+import hashlib
 import argparse
+import multiprocessing
+import numpy as np
 from tqdm import tqdm
-from extractor import call_llm_entity_extraction, parse_entity_extraction_output, spacy_fallback_extract, USE_OPENAI
-from neo4j_client import Neo4jClient
+from extractor import (call_llm_entity_extraction, call_llm_entity_extraction_gleaning, parse_entity_extraction_output,
+                       spacy_fallback_extract, spacy_fallback_extract_batch, iter_packed_extraction,
+                       stream_llm_entity_extraction, merge_repeated_entities, USE_OPENAI)
+from graph_sink import open_sink
 from image_processor import ImageProcessor
+from dedup import cluster_reports, dedup_stats, report_fingerprint
+from journal import IngestJournal
+from pipeline import Pipeline, Stage
+from loaders import iter_report_file, iter_documents
+from consolidate import consolidate_entity_descriptions
+from stage_timer import TIMER
+from config import (ENTITY_EMBEDDING_BATCH_SIZE, LLM_CONCURRENCY, LLM_RPM, LLM_TPM, GLEAN_MAX_PASSES,
+                    SIMILARITY_THRESHOLD, INGEST_JOURNAL_PATH, CONSOLIDATE_MIN_DESCRIPTIONS)
 
 # 默认配置
 DEFAULT_TEXT_FILE = "report_10.txt"
@@ -13,29 +28,12 @@ DEFAULT_IMAGE_DIR = "./images_10/"
 
 def load_texts(path):
     """Load all reports from the input file"""
-    with open(path, "r", encoding="utf-8") as f:
-        content = f.read().strip()
-    parts = [p.strip() for p in content.split("\n\n") if p.strip()]
-    if len(parts) < 2:
-        parts = [p.strip() for p in content.splitlines() if p.strip()]
-    return parts
-
-def create_image_mapping(annotation_file, target_image_dir):
+    return list(iter_report_file(path))
+
+def create_image_mapping(annotation_file, target_image_dir, split="train"):
     """Create mapping between documents and associated images (2 images per document)"""
-    # Load annotation data
-    with open(annotation_file, 'r') as f:
-        data = json.load(f)
-    
-    # Extract image paths for each document
-    mapping = {}
-    for i, item in enumerate(data['train']):
-        doc_id = f"doc_{i+1}"
-        # Each document has 2 associated images
-        image_paths = [os.path.join(target_image_dir, img_path) 
-                      for img_path in item['image_path']]
-        mapping[doc_id] = image_paths
-    
-    return mapping
+    return {doc_id: image_paths for doc_id, _, image_paths
+            in iter_documents(annotation_file, target_image_dir, split)}
 
 def parse_arguments():
     """Parse command line arguments"""
@@ -46,10 +44,367 @@ def parse_arguments():
                         help=f"Path to the annotation JSON file (default: {DEFAULT_ANNOTATION_FILE})")
     parser.add_argument("--image-dir", type=str, default=DEFAULT_IMAGE_DIR,
                         help=f"Directory containing images (default: {DEFAULT_IMAGE_DIR})")
+    parser.add_argument("--from-annotation", action="store_true",
+                        help="Read report texts from the annotation file instead of --text-file")
+    parser.add_argument("--split", type=str, default="train",
+                        help="Annotation split to process (default: train)")
+    parser.add_argument("--offset", type=int, default=0,
+                        help="Skip this many reports of the split (default: 0)")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Process at most this many reports (default: all)")
     parser.add_argument("--clear-db", action="store_true",
                         help="Clear the database before processing")
+    parser.add_argument("--no-llm-cache", action="store_true",
+                        help="Do not read or write the persistent LLM response cache")
+    parser.add_argument("--pack-budget", type=int, default=0,
+                        help="Token budget for packing several reports into one extraction request, 0 disables packing")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream LLM output and write each record to the graph as soon as it is complete")
+    parser.add_argument("--max-records", type=int, default=None,
+                        help="With --stream, stop generation after this many records per report")
+    parser.add_argument("--spacy-batch-size", type=int, default=64,
+                        help="Reports per nlp.pipe batch when USE_OPENAI is false (default: 64)")
+    parser.add_argument("--spacy-processes", type=int, default=1,
+                        help="Worker processes for nlp.pipe when USE_OPENAI is false (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY,
+                        help=f"Concurrent LLM extraction requests, 1 for serial calls (default: {LLM_CONCURRENCY})")
+    parser.add_argument("--glean", type=int, default=GLEAN_MAX_PASSES,
+                        help="Follow-up gleaning passes per long report, not used with --stream or --pack-budget "
+                             f"(default: {GLEAN_MAX_PASSES})")
+    parser.add_argument("--dedup", choices=["off", "exact", "near"], default="exact",
+                        help="Extract once per cluster of identical (exact) or also near-identical (near) reports "
+                             "and reuse the result for every member (default: exact)")
+    parser.add_argument("--dedup-threshold", type=float, default=0.9,
+                        help="Word-shingle Jaccard similarity for --dedup near (default: 0.9)")
+    parser.add_argument("--embed-workers", type=int, default=1,
+                        help="Threads computing CLIP image features (default: 1)")
+    parser.add_argument("--link-workers", type=int, default=1,
+                        help="Threads embedding entity names and scoring them against images (default: 1)")
+    parser.add_argument("--write-workers", type=int, default=2,
+                        help="Threads writing documents to Neo4j (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=16,
+                        help="Documents buffered between pipeline stages (default: 16)")
+    parser.add_argument("--journal", type=str, default=INGEST_JOURNAL_PATH,
+                        help="Progress journal recording the committed stages of each document "
+                             f"(default: {INGEST_JOURNAL_PATH})")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the journal, skipping extraction, embedding and writes already committed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes, each with its own CLIP model and Neo4j driver (default: 1)")
+    parser.add_argument("--shard-by", choices=["index", "hash"], default="index",
+                        help="Assign documents to workers round-robin by index or by doc_id hash (default: index)")
+    parser.add_argument("--timing-report", type=str, default="ingest_timing.json",
+                        help="JSON file for per-stage latency percentiles, throughput, tokens and DB round trips "
+                             "(default: ingest_timing.json)")
+    parser.add_argument("--sink", choices=["neo4j", "file", "null"], default="neo4j",
+                        help="Write the graph to Neo4j, to snapshot files in --sink-dir, or discard it (default: neo4j)")
+    parser.add_argument("--sink-dir", type=str, default="graph_snapshot",
+                        help="Directory for --sink file; load it later with graph_sink.py (default: graph_snapshot)")
+    parser.add_argument("--sink-format", choices=["jsonl", "parquet"], default="jsonl",
+                        help="File format for --sink file, parquet requires pyarrow (default: jsonl)")
+    parser.add_argument("--consolidate", action="store_true",
+                        help="After ingestion, summarize entities whose appended descriptions reach "
+                             "--consolidate-min (Neo4j sink only)")
+    parser.add_argument("--consolidate-min", type=int, default=CONSOLIDATE_MIN_DESCRIPTIONS,
+                        help=f"Descriptions an entity needs before it is summarized "
+                             f"(default: {CONSOLIDATE_MIN_DESCRIPTIONS})")
     return parser.parse_args()
 
+def timed_parse(raw):
+    with TIMER.time("parse"):
+        return parse_entity_extraction_output(raw)
+
+def cluster_documents(docs, args):
+    """Index of the representative report of each report's duplicate cluster under --dedup"""
+    if args.dedup == "off":
+        return list(range(len(docs)))
+    return cluster_reports(docs, near_duplicates=args.dedup == "near", threshold=args.dedup_threshold)
+
+def extract_documents(items, representatives, args, client, llm_cache, image_mapping, journal):
+    """Yield one job per unfinished (doc_id, text) item, in order, carrying its parsed entities and relationships.
+
+    representatives[i] is the position in items of the report whose extraction item i reuses.
+    """
+    doc_ids = [doc_id for doc_id, _ in items]
+    docs = [doc for _, doc in items]
+    fingerprints = [report_fingerprint(doc) for doc in docs]
+    
+    # Reports extracted by an earlier run are read back from the journal instead
+    unique_docs = [doc for idx, doc in enumerate(docs) if representatives[idx] == idx
+                   and not journal.done(doc_ids[idx], "extracted", fingerprints[idx])]
+    shared = {rep for idx, rep in enumerate(representatives) if rep != idx}
+    cluster_parsed = {}
+    
+    # Unless streaming, extract several reports per request or issue requests
+    # concurrently; either way results arrive in document order
+    parsed_outputs = None
+    if not USE_OPENAI:
+        # Without an LLM, run spaCy NER over all reports in batches
+        parsed_outputs = spacy_fallback_extract_batch(unique_docs, batch_size=args.spacy_batch_size,
+                                                      n_process=args.spacy_processes)
+    elif args.stream:
+        pass
+    elif args.pack_budget > 0:
+        pending = [(doc_ids[idx], doc) for idx, doc in enumerate(docs) if representatives[idx] == idx
+                   and not journal.done(doc_ids[idx], "extracted", fingerprints[idx])]
+        parsed_outputs = (parsed for _, parsed in
+                          iter_packed_extraction(pending, token_budget=args.pack_budget, cache=llm_cache))
+    elif args.concurrency > 1:
+        from async_extractor import AsyncExtractionEngine
+        # Worker processes share the account's rate limits
+        engine = AsyncExtractionEngine(max_concurrency=args.concurrency, cache=llm_cache,
+                                       max_gleanings=args.glean, rpm=max(1, LLM_RPM // args.workers),
+                                       tpm=max(1, LLM_TPM // args.workers))
+        parsed_outputs = (raw if isinstance(raw, Exception) else timed_parse(raw)
+                          for _, raw in engine.extract_in_order(unique_docs))
+    
+    for idx, doc in enumerate(docs):
+        doc_id = doc_ids[idx]
+        extracted = journal.get(doc_id, "extracted", fingerprints[idx])
+        if journal.done(doc_id, "links_written", fingerprints[idx]):
+            if idx in shared:
+                cluster_parsed[idx] = extracted["parsed"]
+            continue
+        
+        # Process text entity extraction
+        written = False
+        start = time.perf_counter()
+        try:
+            if extracted is not None:
+                parsed = extracted["parsed"]
+            elif representatives[idx] != idx:
+                parsed = cluster_parsed[representatives[idx]]
+            elif USE_OPENAI and args.stream:
+                # Records are written to the graph while the completion is still generating
+                records = stream_llm_entity_extraction(doc, max_records=args.max_records, cache=llm_cache)
+                # Every mention was written; keep one entity per name and type as without --stream
+                parsed = merge_repeated_entities(client.write_document_records(doc_id, doc, records))
+                written = True
+            elif parsed_outputs is not None:
+                parsed = next(parsed_outputs)
+                if isinstance(parsed, Exception):
+                    raise parsed
+            else:
+                if args.glean > 0:
+                    raw = call_llm_entity_extraction_gleaning(doc, cache=llm_cache, max_gleanings=args.glean)
+                else:
+                    raw = call_llm_entity_extraction(doc, cache=llm_cache)
+                parsed = timed_parse(raw)
+        except Exception as e:
+            print(f"Extraction of {doc_id} failed:", e)
+            parsed = spacy_fallback_extract(doc)
+        # Time the pipeline source waited for this report, LLM calls included
+        TIMER.add("extract", time.perf_counter() - start)
+        if idx in shared:
+            cluster_parsed[idx] = parsed
+        if extracted is None:
+            journal.record(doc_id, "extracted", {"fingerprint": fingerprints[idx], "parsed": parsed})
+        
+        yield {"doc_id": doc_id, "doc": doc, "fingerprint": fingerprints[idx], "parsed": parsed,
+               "written": written, "image_paths": image_mapping.get(doc_id, [])}
+
+def embed_images(job, image_processor, journal):
+    """Pipeline stage: CLIP features of the document's images"""
+    saved = journal.get(job["doc_id"], "images_embedded", job["fingerprint"])
+    if saved is not None:
+        job["images"] = [tuple(image) for image in saved["images"]]
+        return job
+    job["images"] = []
+    for img_path in job["image_paths"]:
+        features = image_processor.extract_features(img_path)
+        if features:
+            job["images"].append((img_path, features))
+    TIMER.count("images", len(job["images"]))
+    journal.record(job["doc_id"], "images_embedded", {"images": job["images"]})
+    return job
+
+def link_entities(job, image_processor):
+    """Pipeline stage: entity name embeddings and the entity-image pairs above the similarity threshold"""
+    entities = job["parsed"]["entities"]
+    job["embeddings"], job["links"] = [], []
+    if not entities:
+        return job
+    # Embed entity names in one batch; the same normalized vectors score the images
+    job["embeddings"] = image_processor.extract_text_features_batch(
+        [entity["name"] for entity in entities],
+        batch_size=ENTITY_EMBEDDING_BATCH_SIZE
+    )
+    if job["images"]:
+        start = time.perf_counter()
+        similarities = np.asarray(job["embeddings"]) @ np.asarray([f for _, f in job["images"]]).T
+        for i, entity in enumerate(entities):
+            for j, (img_path, _) in enumerate(job["images"]):
+                if similarities[i, j] > SIMILARITY_THRESHOLD:
+                    job["links"].append((entity["name"], entity.get("type", "UNKNOWN"), img_path,
+                                         float(similarities[i, j])))
+        TIMER.add("similarity", time.perf_counter() - start)
+    return job
+
+def write_document(job, client, journal):
+    """Pipeline stage: write the document subgraph, entity embeddings, image nodes and links"""
+    parsed = job["parsed"]
+    if not journal.done(job["doc_id"], "graph_written", job["fingerprint"]):
+        with TIMER.time("graph_write"):
+            if not job["written"]:
+                client.create_document_subgraph(job["doc_id"], job["doc"], parsed["entities"],
+                                                parsed["relationships"])
+            if job["embeddings"]:
+                client.set_entity_embeddings(parsed["entities"], job["embeddings"])
+            for img_path, features in job["images"]:
+                client.create_image_node(img_path, features, job["doc_id"])
+        journal.record(job["doc_id"], "graph_written")
+    with TIMER.time("link_write"):
+        for name, entity_type, img_path, similarity in job["links"]:
+            client.link_entity_to_image(name, entity_type, img_path, similarity)
+    journal.record(job["doc_id"], "links_written")
+    TIMER.count("documents")
+    return job
+
+def run_ingestion(items, representatives, args, image_mapping, journal_path, on_progress, on_depths=None,
+                  shard=None):
+    """Ingest (doc_id, text) items through the staged pipeline with this process's own models and connections"""
+    start = time.perf_counter()
+    image_processor = ImageProcessor()
+    client = open_sink(args.sink, args.sink_dir, args.sink_format, shard,
+                       text_encoder=image_processor.extract_text_features_batch)
+    
+    # Reuse LLM responses from earlier runs with identical prompts
+    llm_cache = None
+    if USE_OPENAI and not args.no_llm_cache:
+        from llm_cache import LLMResponseCache
+        llm_cache = LLMResponseCache()
+    
+    # Record committed stages per document so an interrupted run can --resume;
+    # the journals of all shards of earlier runs are consulted
+    journal = IngestJournal(journal_path, resume=args.resume,
+                            read_paths=[args.journal] + sorted(glob.glob(glob.escape(args.journal) + ".*")))
+    finished = sum(journal.done(doc_id, "links_written", report_fingerprint(doc)) for doc_id, doc in items)
+    on_progress(finished)
+    
+    # Extraction feeds the pipeline from this thread; image embedding, linking
+    # and graph writes each run in their own workers behind bounded queues
+    pipeline = Pipeline(
+        [
+            Stage("embed", lambda job: embed_images(job, image_processor, journal), args.embed_workers,
+                  args.queue_size),
+            Stage("link", lambda job: link_entities(job, image_processor), args.link_workers, args.queue_size),
+            Stage("write", lambda job: write_document(job, client, journal), args.write_workers, args.queue_size),
+        ],
+        on_item=lambda job: on_progress(1),
+        on_depths=on_depths,
+    )
+    try:
+        pipeline.run(extract_documents(items, representatives, args, client, llm_cache, image_mapping, journal))
+    finally:
+        journal.close()
+        client.close()
+
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['time_saved_seconds']:.1f}s of LLM time saved")
+        llm_cache.close()
+    return {
+        "documents": pipeline.stats()["write"]["processed"],
+        "resumed": finished,
+        "seconds": time.perf_counter() - start,
+        "failed": {name: stage["failed"] for name, stage in pipeline.stats().items() if stage["failed"]},
+        "timing": TIMER.snapshot(),
+    }
+
+def ingest_shard(worker_id, items, representatives, args, image_mapping, progress_queue):
+    """Worker process entry point: ingest one shard and report progress to the parent"""
+    import torch
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.workers))
+    try:
+        stats = run_ingestion(items, representatives, args, image_mapping, f"{args.journal}.{worker_id}",
+                              on_progress=lambda n: progress_queue.put(("progress", n)), shard=worker_id)
+        progress_queue.put(("finished", worker_id, stats))
+    except Exception as e:
+        progress_queue.put(("error", worker_id, repr(e)))
+        raise
+
+def shard_documents(items, representatives, workers, shard_by):
+    """Split items into per-worker shards, keeping every duplicate cluster within one shard.
+
+    Returns (items, representatives) per shard with representatives renumbered to shard positions.
+    """
+    shards = [([], []) for _ in range(workers)]
+    position = {}
+    for idx, (doc_id, doc) in enumerate(items):
+        rep = representatives[idx]
+        if shard_by == "hash":
+            shard = int(hashlib.sha1(items[rep][0].encode("utf-8")).hexdigest(), 16) % workers
+        else:
+            shard = rep % workers
+        shard_items, shard_reps = shards[shard]
+        position[idx] = len(shard_items)
+        shard_items.append((doc_id, doc))
+        shard_reps.append(position[rep])
+    return shards
+
+def run_workers(items, representatives, args, image_mapping):
+    """Ingest in args.workers processes and aggregate their progress and timings"""
+    ctx = multiprocessing.get_context("spawn")
+    progress_queue = ctx.Queue()
+    processes = []
+    for worker_id, (shard_items, shard_reps) in enumerate(
+            shard_documents(items, representatives, args.workers, args.shard_by)):
+        shard_mapping = {doc_id: image_mapping[doc_id] for doc_id, _ in shard_items if doc_id in image_mapping}
+        process = ctx.Process(target=ingest_shard, name=f"ingest-{worker_id}",
+                              args=(worker_id, shard_items, shard_reps, args, shard_mapping, progress_queue))
+        process.start()
+        processes.append(process)
+    
+    results = {}
+    progress = tqdm(total=len(items), desc=f"Processing documents ({args.workers} workers)")
+    while len(results) < len(processes):
+        try:
+            message = progress_queue.get(timeout=1.0)
+        except queue.Empty:
+            # A worker killed outright (e.g. out of memory) never reports back
+            if not any(process.is_alive() for process in processes) and progress_queue.empty():
+                break
+            continue
+        if message[0] == "progress":
+            progress.update(message[1])
+        elif message[0] == "finished":
+            results[message[1]] = message[2]
+            TIMER.merge(message[2]["timing"])
+        else:
+            print(f"Worker {message[1]} failed:", message[2])
+            results[message[1]] = None
+    progress.close()
+    for process in processes:
+        process.join()
+    
+    for worker_id, stats in sorted(results.items()):
+        if stats is not None:
+            print(f"Worker {worker_id}: {stats['documents']} documents in {stats['seconds']:.1f}s "
+                  f"({stats['documents'] / max(stats['seconds'], 1e-9):.2f} docs/s)")
+    return results
+
+def consolidate(args):
+    """Summarize long entity description lists once all documents are written"""
+    if args.sink != "neo4j":
+        print("Skipping --consolidate: run consolidate.py after loading the snapshot into Neo4j.")
+        return
+    llm_cache = None
+    if USE_OPENAI and not args.no_llm_cache:
+        from llm_cache import LLMResponseCache
+        llm_cache = LLMResponseCache()
+    client = open_sink("neo4j")
+    try:
+        with TIMER.time("consolidate"):
+            stats = consolidate_entity_descriptions(client, args.consolidate_min, cache=llm_cache,
+                                                    concurrency=args.concurrency)
+    finally:
+        client.close()
+        if llm_cache is not None:
+            llm_cache.close()
+    print(f"Consolidated {stats['summarized']}/{stats['candidates']} entities ({stats['failed']} failed).")
+
 def main():
     # 解析命令行参数
     args = parse_arguments()
@@ -59,58 +414,61 @@ def main():
     annotation_file = args.annotation_file
     image_dir = args.image_dir
     
-    docs = load_texts(text_file)
-    image_mapping = create_image_mapping(annotation_file, image_dir)
-    client = Neo4jClient()
-    image_processor = ImageProcessor()
+    # Reports and their images are read lazily, only for the requested slice
+    documents = list(iter_documents(annotation_file, image_dir, args.split,
+                                    text_file=None if args.from_annotation else text_file,
+                                    offset=args.offset, limit=args.limit))
+    items = [(doc_id, doc) for doc_id, doc, _ in documents]
+    docs = [doc for _, doc in items]
+    image_mapping = {doc_id: image_paths for doc_id, _, image_paths in documents if image_paths}
+    
+    # Each duplicate report reuses the extraction of the first report of its cluster
+    representatives = cluster_documents(docs, args)
+    stats = dedup_stats(representatives)
+    print(f"Dedup: {stats['documents']} documents, {stats['unique']} unique "
+          f"({stats['dedup_ratio']:.1%} duplicates), {stats['extractions_saved']} extraction calls saved")
     
+    client = open_sink(args.sink, args.sink_dir, args.sink_format)
     # 根据参数决定是否清空数据库
     if args.clear_db:
         client.clear_all()
         print("The database is cleaned.")
-    
-    for idx, doc in enumerate(tqdm(docs, desc="Processing documents")):
-        doc_id = f"doc_{idx+1}"
-        print(f"\n--- Processing {doc_id} ---")
-        
-        # Process text entity extraction
-        try:
-            if USE_OPENAI:
-                raw = call_llm_entity_extraction(doc)
-                parsed = parse_entity_extraction_output(raw)
-            else:
-                parsed = spacy_fallback_extract(doc)
-        except Exception as e:
-            print("Extraction failed:", e)
-            parsed = spacy_fallback_extract(doc)
-
-        client.create_document_subgraph(doc_id, doc, parsed["entities"], parsed["relationships"])
-        
-        # Process associated images
-        if doc_id in image_mapping:
-            image_paths = image_mapping[doc_id]
-            for img_path in image_paths:
-                # Extract image features
-                features = image_processor.extract_features(img_path)
-                if features:
-                    # Create image node
-                    client.create_image_node(img_path, features, doc_id)
-                    
-                    # Link entities to images based on similarity
-                    for entity in parsed["entities"]:
-                        similarity = image_processor.calculate_similarity(
-                            entity["name"], features
-                        )
-                        if similarity > 0.3:  # Set similarity threshold
-                            client.link_entity_to_image(
-                                entity["name"], 
-                                entity.get("type", "UNKNOWN"), 
-                                img_path, 
-                                similarity
-                            )
-
+        # A cleared database invalidates everything the journal says was written
+        args.resume = False
+    try:
+        client.create_constraints()
+    except Exception as e:
+        # e.g. duplicate nodes left by earlier concurrent runs; MERGE still works without them
+        print("Could not create uniqueness constraints:", e)
+    try:
+        client.create_entity_vector_index()
+    except Exception as e:
+        # e.g. Neo4j before 5.11; entities are still written, only semantic entity lookup is unavailable
+        print("Could not create the entity vector index, continuing without semantic entity lookup:", e)
     client.close()
-    print("All documents processed.")
+    
+    # Journals left by an earlier run (with any number of workers) must not be resumed from later
+    if not args.resume:
+        for stale in glob.glob(glob.escape(args.journal)) + glob.glob(glob.escape(args.journal) + ".*"):
+            os.remove(stale)
+    
+    start = time.perf_counter()
+    if args.workers > 1:
+        results = run_workers(items, representatives, args, image_mapping)
+        processed = sum(stats["documents"] for stats in results.values() if stats)
+    else:
+        progress = tqdm(total=len(items), desc="Processing documents")
+        stats = run_ingestion(items, representatives, args, image_mapping, args.journal,
+                              on_progress=progress.update, on_depths=progress.set_postfix)
+        progress.close()
+        processed = stats["documents"]
+        if stats["failed"]:
+            print("Documents dropped after a stage failure:", stats["failed"])
+    elapsed = time.perf_counter() - start
+    print(f"All documents processed: {processed} in {elapsed:.1f}s.")
+    if args.consolidate:
+        consolidate(args)
+    TIMER.report(elapsed, path=args.timing_report)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
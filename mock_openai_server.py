@@ -0,0 +1,290 @@
+# mock_openai_server.py
+"""Local OpenAI-compatible stand-in for the ChatCompletion endpoint.
+
+Serves deterministic entity_extraction-formatted outputs derived from the
+report in the prompt, with configurable latency, error injection and
+streaming, so extraction and VQA throughput can be measured offline.
+
+Usage:
+    python mock_openai_server.py --port 8001 --latency lognormal --latency-ms 800 --rate-429 0.05
+    export OPENAI_API_BASE=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import TUPLE_DELIM, RECORD_DELIM, COMPLETION_DELIM
+
+# Terms recognised in reports, with their entity type
+VOCABULARY = {
+    "anatomy": ["lung", "lungs", "heart", "mediastinum", "cardiomediastinal silhouette", "pleura",
+                "spine", "diaphragm", "hilum", "aorta", "lung bases", "left lower lobe", "right lower lobe",
+                "right upper lobe", "left upper lobe", "costophrenic angle", "pulmonary vascularity",
+                "bony structures", "soft tissues", "thoracic spine", "ribs"],
+    "finding": ["pneumothorax", "pleural effusion", "effusion", "atelectasis", "opacity", "opacities",
+                "consolidation", "granuloma", "nodule", "cardiomegaly", "edema", "airspace disease",
+                "degenerative changes", "hiatal hernia", "scarring", "hyperinflation", "calcified"],
+    "disease": ["pneumonia", "emphysema", "copd", "tuberculosis", "fracture", "scoliosis"],
+    "device": ["pacemaker", "sternotomy wires", "catheter", "surgical clips", "port", "tube"],
+    "procedure": ["sternotomy", "cabg", "surgery", "resection"],
+}
+_TERM_RE = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(t) for terms in VOCABULARY.values() for t in terms),
+                             key=len, reverse=True)) + r")\b"
+)
+_TERM_TYPES = {term: etype for etype, terms in VOCABULARY.items() for term in terms}
+
+
+def extract_canned_records(report: str):
+    """Deterministic entity and relationship records for a report"""
+    entities, relationships, seen = [], [], set()
+    for sentence in re.split(r"(?<=[.!?])\s+", report.lower()):
+        sentence_entities = []
+        for match in _TERM_RE.finditer(sentence):
+            term = match.group(1)
+            etype = _TERM_TYPES[term]
+            sentence_entities.append((term.upper(), etype))
+            if term not in seen:
+                seen.add(term)
+                entities.append(
+                    f'("entity"{TUPLE_DELIM}{term.upper()}{TUPLE_DELIM}{etype}{TUPLE_DELIM}'
+                    f'{sentence.strip().rstrip(".")})'
+                )
+        anatomy = [name for name, etype in sentence_entities if etype == "anatomy"]
+        for name, etype in sentence_entities:
+            if etype != "anatomy" and anatomy:
+                relationships.append(
+                    f'("relationship"{TUPLE_DELIM}{anatomy[0]}{TUPLE_DELIM}{name}{TUPLE_DELIM}'
+                    f'{name.lower()} described in relation to {anatomy[0].lower()}{TUPLE_DELIM}7)'
+                )
+    return entities, relationships
+
+
+class MockBehaviour:
+    """Latency, error injection and output shaping shared by all request handlers"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "server_errors": 0, "timeouts": 0}
+
+    def latency(self) -> float:
+        mean = self.args.latency_ms / 1000.0
+        with self.lock:
+            if self.args.latency == "uniform":
+                return self.rng.uniform(0, 2 * mean)
+            if self.args.latency == "lognormal":
+                # Median of exp(mu) equals the configured mean latency
+                return self.rng.lognormvariate(0, self.args.latency_sigma) * mean
+            return mean
+
+    def draw_fault(self):
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.args.rate_429:
+            return "rate_limited"
+        roll -= self.args.rate_429
+        if roll < self.args.rate_500:
+            return "server_errors"
+        roll -= self.args.rate_500
+        if roll < self.args.rate_timeout:
+            return "timeouts"
+        return None
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def respond(self, messages) -> str:
+        """Canned completion for the conversation, based on which prompt it carries"""
+        user_messages = [m["content"] for m in messages if m["role"] == "user"]
+        last = user_messages[-1] if user_messages else ""
+        first = user_messages[0] if user_messages else ""
+
+        if "Reports to process:" in first and len(user_messages) == 1:
+            body = first.split("Reports to process:", 1)[1]
+            out = []
+            for doc_id, report in re.findall(r"\[DOC ([^\]]+)\]\n(.*?)(?=\n\n\[DOC |\Z)", body, re.S):
+                entities, relationships = extract_canned_records(report)
+                out.append(f'("document"{TUPLE_DELIM}{doc_id})')
+                out.extend(entities + relationships)
+            return RECORD_DELIM.join(out) + RECORD_DELIM + COMPLETION_DELIM
+
+        if "Text to process:" in first:
+            report = first.split("Text to process:", 1)[1]
+            entities, relationships = extract_canned_records(report)
+            # The first pass returns only part of the entities so gleaning has something to find
+            already = "\n".join(m["content"] for m in messages if m["role"] == "assistant")
+            missing = [e for e in entities if e not in already]
+            if "Answer YES | NO" in last:
+                return "YES" if missing else "NO"
+            batch = missing[:self.args.entities_per_pass]
+            if len(user_messages) == 1:
+                batch = batch + relationships
+            return RECORD_DELIM.join(batch) + RECORD_DELIM + COMPLETION_DELIM
+
+        if "Description List:" in last:
+            descriptions = last.split("Description List:", 1)[1].split("#######")[0]
+            entity = last.split("Entities:", 1)[1].split("\n", 1)[0].strip()
+            return f"{entity}: " + " ".join(d.strip(" []'\",") for d in descriptions.split("<SEP>"))
+
+        terms = sorted({m.group(1) for m in _TERM_RE.finditer(last.lower())})
+        if terms:
+            return "Based on the provided context, the report mentions: " + ", ".join(terms) + "."
+        return "The context does not contain enough information to answer the question."
+
+
+class Handler(BaseHTTPRequestHandler):
+    behaviour = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.behaviour.args.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self._send_json(200, {"status": "ok"})
+        elif self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            self._send_json(200, self.behaviour.stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        behaviour = self.behaviour
+        behaviour.count("requests")
+
+        fault = behaviour.draw_fault()
+        if fault == "timeouts":
+            behaviour.count(fault)
+            time.sleep(behaviour.args.timeout_seconds)
+            self.close_connection = True
+            return
+        time.sleep(behaviour.latency())
+        if fault == "rate_limited":
+            behaviour.count(fault)
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                            headers={"Retry-After": str(behaviour.args.retry_after)})
+            return
+        if fault == "server_errors":
+            behaviour.count(fault)
+            self._send_json(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+            return
+
+        messages = request.get("messages", [])
+        content = behaviour.respond(messages)
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "mock")
+        behaviour.count("ok")
+
+        if request.get("stream"):
+            self._stream(completion_id, model, content)
+            return
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def _stream(self, completion_id, model, content):
+        """Send the completion as server-sent events, ~4 characters per token"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        delay = 1.0 / self.behaviour.args.tokens_per_second if self.behaviour.args.tokens_per_second else 0
+        tokens = [content[i:i + 4] for i in range(0, len(content), 4)]
+        try:
+            for i, token in enumerate(tokens):
+                delta = {"content": token} if i else {"role": "assistant", "content": token}
+                self._send_event({"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                                  "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                if delay:
+                    time.sleep(delay)
+            self._send_event({"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                              "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. after reaching its max-records budget
+            pass
+
+    def _send_event(self, payload):
+        self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        self.wfile.flush()
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible ChatCompletion stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="fixed",
+                        help="Latency distribution of each response (default: fixed)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean (median for lognormal) latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Shape of the lognormal distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Streaming speed, 0 sends all chunks immediately")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-timeout", type=float, default=0.0,
+                        help="Fraction of requests that hang for --timeout-seconds and get no response")
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After header sent with 429s")
+    parser.add_argument("--entities-per-pass", type=int, default=1000,
+                        help="Entities returned per extraction pass; lower it to exercise gleaning")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args(argv)
+
+
+def make_server(args):
+    """Build the HTTP server for the given arguments without starting it"""
+    handler = type("MockHandler", (Handler,), {"behaviour": MockBehaviour(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    args = parse_arguments()
+    server = make_server(args)
+    print(f"Mock OpenAI server listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Requests:", server.RequestHandlerClass.behaviour.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,345 @@
+import time
+import random
 from neo4j import GraphDatabase
-from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+from neo4j.exceptions import TransientError
+from config import (NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_MAX_RETRIES, FEATURE_DIM, ENTITY_VECTOR_INDEX,
+                    QUERY_CACHE_TTL, QUERY_CACHE_SIZE, STREAM_FETCH_SIZE,
+                    NEO4J_INSTRUMENT, NEO4J_PROFILE, NEO4J_PROFILE_REPORT)
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
+from query_cache import QueryCache, cached_read, invalidates_cache
+from query_profiler import QueryProfiler
+from stage_timer import TIMER
+
+
+_MERGE_DOCUMENT = (
+    "MERGE (d:Document {doc_id:$doc_id}) "
+    "SET d.text=$text"
+)
+
+
+# Ingestion only appends new descriptions of an entity; consolidate.py later merges long lists
+# into one summary, so no document write waits for an LLM call. The list is read and written
+# back, so the node's write lock is taken first (setting a property locks it); without it two
+# writers appending to a shared entity such as LUNGS can both read the old list and lose one append
+_LOCK_ENTITY = "SET e._lock = true WITH * "
+_UNLOCK_ENTITY = "REMOVE e._lock "
+_APPEND_DESCRIPTION = _LOCK_ENTITY + (
+    "SET e.description = CASE WHEN coalesce(e.description, '') = '' THEN {desc} ELSE e.description END, "
+    "e.descriptions = CASE WHEN {desc} = '' OR {desc} IN coalesce(e.descriptions, []) "
+    "THEN coalesce(e.descriptions, []) ELSE coalesce(e.descriptions, []) + {desc} END "
+) + _UNLOCK_ENTITY
+
+
+def _page_clause(skip, limit):
+    """Build the SKIP/LIMIT suffix for a paginated query"""
+    clause = " SKIP $skip" if skip else ""
+    if limit is not None:
+        clause += " LIMIT $limit"
+    return clause
+
 
 class Neo4jClient:
-    def __init__(self, uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD):
+    def __init__(self, uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD, text_encoder=None,
+                 cache_ttl=QUERY_CACHE_TTL, cache_size=QUERY_CACHE_SIZE,
+                 instrument=NEO4J_INSTRUMENT, profile=NEO4J_PROFILE, profile_report=NEO4J_PROFILE_REPORT,
+                 max_retries=NEO4J_MAX_RETRIES):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        # Concurrent writers can deadlock on shared entities; such queries are retried
+        self.max_retries = max_retries
+        # Callable mapping a list of texts to a list of feature vectors,
+        # e.g. ImageProcessor.extract_text_features_batch
+        self.text_encoder = text_encoder
+        # Optional read-through cache for lookups, invalidated by writes through this client
+        self.cache = QueryCache(max_entries=cache_size, ttl=cache_ttl) if cache_ttl > 0 else None
+        # Optional per-query instrumentation, PROFILE implies instrumentation
+        self.profiler = QueryProfiler(profile, profile_report) if instrument or profile else None
 
     def close(self):
         self.driver.close()
+        if self.profiler is not None:
+            self.profiler.dump()
+
+    def _run(self, session, method, query, profile=True, **params):
+        """Run a query and return all of its records, retrying transient errors such as deadlocks.
 
+        Every write is an idempotent MERGE/SET in its own transaction, so a
+        retried query cannot apply twice.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._run_once(session, method, query, profile, **params)
+            except TransientError:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(min(2.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def _run_once(self, session, method, query, profile=True, **params):
+        """Run a query and return all of its records, recording statistics when instrumented"""
+        TIMER.count("db_round_trips")
+        if self.profiler is None:
+            return list(session.run(query, **params))
+        if self.profiler.profile and profile:
+            query = "PROFILE " + query
+        start = time.perf_counter()
+        result = session.run(query, **params)
+        records = list(result)
+        summary = result.consume()
+        self.profiler.record(method, time.perf_counter() - start, len(records), summary)
+        return records
+
+    def _stream(self, session, method, query, **params):
+        """Yield the records of a query lazily, recording statistics when instrumented"""
+        TIMER.count("db_round_trips")
+        if self.profiler is None:
+            yield from session.run(query, **params)
+            return
+        if self.profiler.profile:
+            query = "PROFILE " + query
+        start = time.perf_counter()
+        result = session.run(query, **params)
+        rows = 0
+        for record in result:
+            rows += 1
+            yield record
+        summary = result.consume()
+        self.profiler.record(method, time.perf_counter() - start, rows, summary)
+
+    def cache_stats(self):
+        """Return read cache hit rate and memory usage, or None if caching is disabled"""
+        return self.cache.stats() if self.cache is not None else None
+
+    @invalidates_cache
     def create_document_subgraph(self, doc_id: str, doc_text: str, entities: list, relationships: list):
         """Create a Document node, associated Entity nodes, and their relationships"""
         with self.driver.session() as session:
             # Create Document node
-            session.run(
-                "MERGE (d:Document {doc_id:$doc_id}) "
-                "SET d.text=$text",
-                doc_id=doc_id, text=doc_text
-            )
-            # Create Entity nodes and link them to the Document
-            for ent in entities:
-                session.run(
-                    "MERGE (e:Entity {name:$name, type:$type}) "
-                    "SET e.description=$desc",
-                    name=ent["name"], type=ent.get("type","UNKNOWN"), desc=ent.get("description","")
-                )
-                session.run(
-                    "MATCH (d:Document {doc_id:$doc_id}), (e:Entity {name:$name, type:$type}) "
-                    "MERGE (d)-[:MENTIONS]->(e)",
-                    doc_id=doc_id, name=ent["name"], type=ent.get("type","UNKNOWN")
-                )
+            self._run(session, "create_document_subgraph", _MERGE_DOCUMENT, doc_id=doc_id, text=doc_text)
+            # Create Entity nodes and link them to the Document, in key order so
+            # concurrent writers lock shared entities in the same order
+            for ent in sorted(entities, key=lambda e: (e["name"], e.get("type","UNKNOWN"))):
+                self._write_entity(session, "create_document_subgraph", doc_id, ent)
             # Create relationships between Entities
             for rel in relationships:
-                session.run(
-                    "MATCH (s:Entity {name:$sname}), (t:Entity {name:$tname}) "
-                    "MERGE (s)-[r:RELATED_TO {desc:$desc, strength:$strength}]->(t)",
-                    sname=rel["source"], tname=rel["target"],
-                    desc=rel.get("description",""), strength=rel.get("strength","")
-                )
+                self._write_relationship(session, "create_document_subgraph", rel)
 
+    @invalidates_cache
+    def write_document_records(self, doc_id: str, doc_text: str, records):
+        """Create a Document node and write streamed (tag, value) records as they arrive.
+
+        Returns the entities and relationships that were written.
+        """
+        written = {"entities": [], "relationships": []}
+        with self.driver.session() as session:
+            self._run(session, "write_document_records", _MERGE_DOCUMENT, doc_id=doc_id, text=doc_text)
+            for tag, value in records:
+                if tag == "entity":
+                    self._write_entity(session, "write_document_records", doc_id, value)
+                    written["entities"].append(value)
+                elif tag == "relationship":
+                    self._write_relationship(session, "write_document_records", value)
+                    written["relationships"].append(value)
+        return written
+
+    def _write_entity(self, session, method, doc_id, ent):
+        self._run(
+            session, method,
+            "MERGE (e:Entity {name:$name, type:$type}) " + _APPEND_DESCRIPTION.format(desc="$desc"),
+            name=ent["name"], type=ent.get("type","UNKNOWN"), desc=ent.get("description","")
+        )
+        self._run(
+            session, method,
+            "MATCH (d:Document {doc_id:$doc_id}), (e:Entity {name:$name, type:$type}) "
+            "MERGE (d)-[:MENTIONS]->(e)",
+            doc_id=doc_id, name=ent["name"], type=ent.get("type","UNKNOWN")
+        )
+
+    def _write_relationship(self, session, method, rel):
+        self._run(
+            session, method,
+            "MATCH (s:Entity {name:$sname}), (t:Entity {name:$tname}) "
+            "MERGE (s)-[r:RELATED_TO {desc:$desc, strength:$strength}]->(t)",
+            sname=rel["source"], tname=rel["target"],
+            desc=rel.get("description",""), strength=rel.get("strength","")
+        )
+
+    @invalidates_cache
     def create_image_node(self, image_path: str, feature_vector: list, doc_id: str):
         """Create an Image node and link it to the Document"""
         with self.driver.session() as session:
             # Create Image node
-            session.run(
+            self._run(
+                session, "create_image_node",
                 "MERGE (i:Image {path:$path}) "
                 "SET i.feature_vector = $feature_vector, i.doc_id = $doc_id",
                 path=image_path, feature_vector=feature_vector, doc_id=doc_id
             )
             # Link to document
-            session.run(
+            self._run(
+                session, "create_image_node",
                 "MATCH (d:Document {doc_id:$doc_id}), (i:Image {path:$path}) "
                 "MERGE (d)-[:HAS_IMAGE]->(i)",
                 doc_id=doc_id, path=image_path
             )
     
+    @invalidates_cache
     def link_entity_to_image(self, entity_name: str, entity_type: str, image_path: str, similarity: float):
         """Link Entity to Image based on similarity"""
         with self.driver.session() as session:
-            session.run(
+            self._run(
+                session, "link_entity_to_image",
                 "MATCH (e:Entity {name:$name, type:$type}), (i:Image {path:$path}) "
                 "MERGE (e)-[r:APPEARS_IN]->(i) "
                 "SET r.similarity = $similarity",
                 name=entity_name, type=entity_type, path=image_path, similarity=similarity
             )
 
+    def create_entity_vector_index(self, dimensions=FEATURE_DIM, index_name=ENTITY_VECTOR_INDEX):
+        """Create the vector index over Entity embeddings if it does not exist"""
+        with self.driver.session() as session:
+            # Schema commands cannot be profiled
+            self._run(
+                session, "create_entity_vector_index",
+                f"CREATE VECTOR INDEX {index_name} IF NOT EXISTS "
+                "FOR (e:Entity) ON e.embedding "
+                "OPTIONS {indexConfig: {`vector.dimensions`: $dimensions, "
+                "`vector.similarity_function`: 'cosine'}}",
+                profile=False, dimensions=dimensions
+            )
+
+    def has_vector_index(self, index_name=ENTITY_VECTOR_INDEX) -> bool:
+        """Whether the vector index exists and is online; False on servers without vector index support"""
+        try:
+            with self.driver.session() as session:
+                records = self._run(
+                    session, "has_vector_index",
+                    "SHOW INDEXES YIELD name, type, state WHERE name = $index_name AND type = 'VECTOR' "
+                    "RETURN state",
+                    profile=False, index_name=index_name
+                )
+        except Exception as e:
+            print(f"Could not check for vector index {index_name}:", e)
+            return False
+        return any(record["state"] == "ONLINE" for record in records)
+
+    def create_constraints(self):
+        """Create uniqueness constraints on the MERGE keys so concurrent writers cannot duplicate nodes"""
+        constraints = [
+            "CREATE CONSTRAINT document_key IF NOT EXISTS FOR (d:Document) REQUIRE d.doc_id IS UNIQUE",
+            "CREATE CONSTRAINT entity_key IF NOT EXISTS FOR (e:Entity) REQUIRE (e.name, e.type) IS UNIQUE",
+            "CREATE CONSTRAINT image_key IF NOT EXISTS FOR (i:Image) REQUIRE i.path IS UNIQUE",
+        ]
+        with self.driver.session() as session:
+            for query in constraints:
+                self._run(session, "create_constraints", query, profile=False)
+
+    @invalidates_cache
+    def set_entity_embeddings(self, entities: list, embeddings: list):
+        """Store text embeddings on Entity nodes in a single batched write"""
+        rows = [
+            {"name": ent["name"], "type": ent.get("type","UNKNOWN"), "embedding": emb}
+            for ent, emb in zip(entities, embeddings) if emb is not None
+        ]
+        if not rows:
+            return
+        with self.driver.session() as session:
+            self._run(
+                session, "set_entity_embeddings",
+                "UNWIND $rows AS row "
+                "MATCH (e:Entity {name:row.name, type:row.type}) "
+                "SET e.embedding = row.embedding",
+                rows=rows
+            )
+
+    def iter_entities_to_consolidate(self, min_descriptions: int, fetch_size=STREAM_FETCH_SIZE):
+        """Stream entities whose appended description list has at least min_descriptions entries"""
+        with self.driver.session(fetch_size=fetch_size) as session:
+            result = self._stream(
+                session, "iter_entities_to_consolidate",
+                "MATCH (e:Entity) WHERE size(coalesce(e.descriptions, [])) >= $min_descriptions "
+                "RETURN e.name AS name, e.type AS type, e.descriptions AS descriptions",
+                min_descriptions=min_descriptions
+            )
+            for record in result:
+                yield dict(record)
+
+    @invalidates_cache
+    def set_entity_summaries(self, rows: list):
+        """Replace the consumed descriptions of each entity with its summary in a single batched write.
+
+        Descriptions appended after the list was read are kept for the next pass.
+        """
+        if not rows:
+            return
+        with self.driver.session() as session:
+            self._run(
+                session, "set_entity_summaries",
+                "UNWIND $rows AS row "
+                "MATCH (e:Entity {name:row.name, type:row.type}) " + _LOCK_ENTITY +
+                "SET e.description = row.summary, "
+                "e.descriptions = [row.summary] + [d IN coalesce(e.descriptions, []) "
+                "WHERE NOT d IN row.consumed AND d <> row.summary] " + _UNLOCK_ENTITY,
+                rows=rows
+            )
+
+    # UNWIND writes per graph snapshot table, mirroring the per-document write methods
+    _SNAPSHOT_QUERIES = {
+        "documents": (
+            "UNWIND $rows AS row "
+            "MERGE (d:Document {doc_id:row.doc_id}) SET d.text=row.text"
+        ),
+        "entities": (
+            "UNWIND $rows AS row "
+            "MERGE (e:Entity {name:row.name, type:row.type}) " + _APPEND_DESCRIPTION.format(desc="row.description") +
+            "WITH e, row MATCH (d:Document {doc_id:row.doc_id}) "
+            "MERGE (d)-[:MENTIONS]->(e)"
+        ),
+        "relationships": (
+            "UNWIND $rows AS row "
+            "MATCH (s:Entity {name:row.source}), (t:Entity {name:row.target}) "
+            "MERGE (s)-[r:RELATED_TO {desc:row.description, strength:row.strength}]->(t)"
+        ),
+        "entity_embeddings": (
+            "UNWIND $rows AS row "
+            "MATCH (e:Entity {name:row.name, type:row.type}) SET e.embedding = row.embedding"
+        ),
+        "images": (
+            "UNWIND $rows AS row "
+            "MERGE (i:Image {path:row.path}) SET i.feature_vector = row.feature_vector, i.doc_id = row.doc_id "
+            "WITH i, row MATCH (d:Document {doc_id:row.doc_id}) "
+            "MERGE (d)-[:HAS_IMAGE]->(i)"
+        ),
+        "links": (
+            "UNWIND $rows AS row "
+            "MATCH (e:Entity {name:row.name, type:row.type}), (i:Image {path:row.path}) "
+            "MERGE (e)-[r:APPEARS_IN]->(i) SET r.similarity = row.similarity"
+        ),
+    }
+
+    @invalidates_cache
+    def write_snapshot_rows(self, table: str, rows: list):
+        """Bulk-write one batch of rows of a graph snapshot table (see graph_sink.FileSink)"""
+        if not rows:
+            return
+        with self.driver.session() as session:
+            self._run(session, "write_snapshot_rows", self._SNAPSHOT_QUERIES[table], rows=rows)
+
+    @invalidates_cache
     def clear_all(self):
         """Delete all nodes and relationships in the database (for testing)"""
         with self.driver.session() as session:
-            session.run("MATCH (n) DETACH DELETE n")
+            self._run(session, "clear_all", "MATCH (n) DETACH DELETE n")
     
-    def find_similar_images(self, feature_vector, top_k=5):
-        """Find images with similar feature vectors using cosine similarity"""
+    def find_similar_images(self, feature_vector, top_k=5, exclude_doc_id=None):
+        """Find images with similar feature vectors using cosine similarity, optionally skipping one document's images"""
         with self.driver.session() as session:
             # Get all images with their feature vectors
-            result = session.run(
-                "MATCH (i:Image) RETURN i.path AS path, i.feature_vector AS feature_vector"
+            result = self._run(
+                session, "find_similar_images",
+                "MATCH (i:Image) "
+                + ("WHERE coalesce(i.doc_id, '') <> $exclude_doc_id " if exclude_doc_id is not None else "")
+                + "RETURN i.path AS path, i.feature_vector AS feature_vector",
+                exclude_doc_id=exclude_doc_id
             )
             
             images = []
@@ -96,45 +359,122 @@ class Neo4jClient:
             sorted_indices = np.argsort(similarities)[::-1][:top_k]
             return [(images[i], similarities[i]) for i in sorted_indices]
     
+    @cached_read
     def get_document_by_image(self, image_path):
         """Get document associated with an image"""
         with self.driver.session() as session:
-            result = session.run(
+            records = self._run(
+                session, "get_document_by_image",
                 "MATCH (d:Document)-[:HAS_IMAGE]->(i:Image {path:$path}) "
                 "RETURN d.doc_id AS doc_id, d.text AS text",
                 path=image_path
             )
-            return result.single()
+            return dict(records[0]) if records else None
+    
+    @cached_read
+    def get_image_context(self, image_path, max_entities=10, max_related=3):
+        """Get the document, ranked entities and their top related entities for an image in one query"""
+        with self.driver.session() as session:
+            records = self._run(
+                session, "get_image_context",
+                "MATCH (d:Document)-[:HAS_IMAGE]->(i:Image {path:$path}) "
+                "RETURN d.doc_id AS doc_id, d.text AS text, COLLECT { "
+                "  MATCH (e:Entity)-[r:APPEARS_IN]->(i) "
+                "  WITH e, r ORDER BY r.similarity DESC LIMIT $max_entities "
+                "  RETURN {name: e.name, type: e.type, description: e.description, similarity: r.similarity, "
+                "    related_entities: COLLECT { "
+                "      MATCH (e)-[rr:RELATED_TO]->(e2:Entity) "
+                "      WITH e2, rr ORDER BY rr.strength DESC LIMIT $max_related "
+                "      RETURN {name: e2.name, type: e2.type, description: e2.description, "
+                "              strength: rr.strength, relation_desc: rr.desc} "
+                "    }} "
+                "} AS entities",
+                path=image_path, max_entities=max_entities, max_related=max_related
+            )
+            if not records:
+                return None
+            record = records[0]
+            return {
+                "document": {"doc_id": record["doc_id"], "text": record["text"]},
+                "entities": record["entities"]
+            }
     
+    @cached_read
     def get_entities_by_image(self, image_path):
         """Get entities associated with an image"""
-        with self.driver.session() as session:
-            result = session.run(
+        return list(self.iter_entities_by_image(image_path))
+    
+    def iter_entities_by_image(self, image_path, fetch_size=STREAM_FETCH_SIZE, skip=0, limit=None):
+        """Stream entities associated with an image, most similar first"""
+        with self.driver.session(fetch_size=fetch_size) as session:
+            result = self._stream(
+                session, "iter_entities_by_image",
                 "MATCH (e:Entity)-[r:APPEARS_IN]->(i:Image {path:$path}) "
                 "RETURN e.name AS name, e.type AS type, e.description AS description, r.similarity AS similarity "
-                "ORDER BY r.similarity DESC",
-                path=image_path
+                "ORDER BY r.similarity DESC" + _page_clause(skip, limit),
+                path=image_path, skip=skip, limit=limit
             )
-            return [dict(record) for record in result]
+            for record in result:
+                yield dict(record)
     
+    @cached_read
     def get_related_entities(self, entity_name, entity_type):
         """Get entities related to a specific entity"""
-        with self.driver.session() as session:
-            result = session.run(
+        return list(self.iter_related_entities(entity_name, entity_type))
+    
+    def iter_related_entities(self, entity_name, entity_type, fetch_size=STREAM_FETCH_SIZE, skip=0, limit=None):
+        """Stream entities related to a specific entity, strongest first"""
+        with self.driver.session(fetch_size=fetch_size) as session:
+            result = self._stream(
+                session, "iter_related_entities",
                 "MATCH (e1:Entity {name:$name, type:$type})-[r:RELATED_TO]->(e2:Entity) "
                 "RETURN e2.name AS name, e2.type AS type, e2.description AS description, r.strength AS strength, r.desc AS relation_desc "
-                "ORDER BY r.strength DESC",
-                name=entity_name, type=entity_type
+                "ORDER BY r.strength DESC" + _page_clause(skip, limit),
+                name=entity_name, type=entity_type, skip=skip, limit=limit
             )
-            return [dict(record) for record in result]
+            for record in result:
+                yield dict(record)
     
+    @cached_read
     def search_entities_by_text(self, search_text):
         """Search entities by text similarity in name or description"""
-        with self.driver.session() as session:
-            result = session.run(
+        return list(self.iter_search_entities_by_text(search_text))
+    
+    def iter_search_entities_by_text(self, search_text, fetch_size=STREAM_FETCH_SIZE, skip=0, limit=None,
+                                     after_name=None, after_type=None):
+        """Stream entities matching the text, ordered by name and type.
+
+        Pass the last name and type seen as after_name and after_type to fetch the
+        next page by keyset instead of skipping over already returned rows. Entities
+        are unique on (name, type), so paging on the name alone would skip e.g. the
+        disease EFFUSION when the finding EFFUSION ended the previous page.
+        """
+        with self.driver.session(fetch_size=fetch_size) as session:
+            result = self._stream(
+                session, "iter_search_entities_by_text",
                 "MATCH (e:Entity) "
-                "WHERE e.name CONTAINS $search_text OR e.description CONTAINS $search_text "
-                "RETURN e.name AS name, e.type AS type, e.description AS description",
-                search_text=search_text.lower()
+                "WHERE (e.name CONTAINS $search_text OR e.description CONTAINS $search_text) "
+                "AND ($after_name IS NULL OR e.name > $after_name "
+                "OR (e.name = $after_name AND $after_type IS NOT NULL AND e.type > $after_type)) "
+                "RETURN e.name AS name, e.type AS type, e.description AS description "
+                "ORDER BY e.name, e.type" + _page_clause(skip, limit),
+                search_text=search_text.lower(), after_name=after_name, after_type=after_type,
+                skip=skip, limit=limit
             )
-            return [dict(record) for record in result]
\ No newline at end of file
+            for record in result:
+                yield dict(record)
+    
+    @cached_read
+    def find_similar_entities(self, text, top_k=5, index_name=ENTITY_VECTOR_INDEX):
+        """Find entities semantically similar to the text using the entity vector index"""
+        if self.text_encoder is None:
+            raise RuntimeError("find_similar_entities requires a text_encoder")
+        query_vector = self.text_encoder([text])[0]
+        with self.driver.session() as session:
+            result = self._run(
+                session, "find_similar_entities",
+                "CALL db.index.vector.queryNodes($index_name, $top_k, $vector) YIELD node, score "
+                "RETURN node.name AS name, node.type AS type, node.description AS description, score AS similarity",
+                index_name=index_name, top_k=top_k, vector=query_vector
+            )
+            return [dict(record) for record in result]
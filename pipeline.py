@@ -0,0 +1,103 @@
+# pipeline.py
+import queue
+import threading
+from typing import Callable, Iterable, List
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage:
+    """A pipeline step: fn(item) -> item run by its own worker threads, fed by a bounded queue"""
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = 16):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.processed = 0
+        self.failed = 0
+        self._finished = 0
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """Push items through stages connected by bounded queues.
+
+    Each stage runs concurrently with the others, so a full queue blocks its
+    producer (backpressure) and throughput is set by the slowest stage rather
+    than the sum of all stages. Items a stage fails on are reported and dropped.
+    """
+
+    def __init__(self, stages: List[Stage], on_item: Callable = None, on_depths: Callable = None,
+                 monitor_interval: float = 1.0):
+        self.stages = stages
+        # on_item(item) is called for every item leaving the last stage
+        self.on_item = on_item
+        # on_depths({stage: queued items}) is called every monitor_interval seconds
+        self.on_depths = on_depths
+        self.monitor_interval = monitor_interval
+
+    def depths(self) -> dict:
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
+
+    def stats(self) -> dict:
+        return {stage.name: {"processed": stage.processed, "failed": stage.failed} for stage in self.stages}
+
+    def _worker(self, position: int):
+        stage = self.stages[position]
+        downstream = self.stages[position + 1] if position + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                with stage._lock:
+                    stage._finished += 1
+                    last = stage._finished == stage.workers
+                # The last worker to finish closes the next stage
+                if last and downstream is not None:
+                    for _ in range(downstream.workers):
+                        downstream.queue.put(_DONE)
+                return
+            try:
+                item = stage.fn(item)
+            except Exception as e:
+                print(f"[{stage.name}] failed:", e)
+                with stage._lock:
+                    stage.failed += 1
+                continue
+            with stage._lock:
+                stage.processed += 1
+            if downstream is not None:
+                downstream.queue.put(item)
+            elif self.on_item is not None:
+                self.on_item(item)
+
+    def run(self, items: Iterable):
+        """Feed items from the calling thread and block until every stage has drained"""
+        threads = [threading.Thread(target=self._worker, args=(position,), daemon=True,
+                                    name=f"{stage.name}-{n}")
+                   for position, stage in enumerate(self.stages) for n in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+
+        stop = threading.Event()
+        monitor = None
+        if self.on_depths is not None:
+            def watch():
+                while not stop.wait(self.monitor_interval):
+                    self.on_depths(self.depths())
+            monitor = threading.Thread(target=watch, daemon=True, name="pipeline-monitor")
+            monitor.start()
+
+        first = self.stages[0]
+        try:
+            for item in items:
+                first.queue.put(item)
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(_DONE)
+            for thread in threads:
+                thread.join()
+            stop.set()
+            if monitor is not None:
+                monitor.join()
@@ -91,6 +91,49 @@ Text to process:
 """
 
 
+PROMPTS[
+    "entity_extraction_packed"
+] = """You are an expert medical information extractor.
+
+Given the following radiology reports, extract ENTITIES and RELATIONSHIPS from each report separately.
+Each report starts with a line of the form [DOC DOCUMENT_ID].
+
+Entity categories to consider: {entity_types}
+
+---
+
+**Output Format:**
+For every report, first output a document record, then the entity and relationship records of that report only.
+Fields are separated by the tuple delimiter {tuple_delimiter}.
+Each record must be separated by the record delimiter {record_delimiter}.
+Process every report, then end your answer with {completion_delimiter}.
+
+Document record format:
+("document"{tuple_delimiter}DOCUMENT_ID)
+
+Entity record format:
+("entity"{tuple_delimiter}ENTITY_NAME{tuple_delimiter}ENTITY_TYPE{tuple_delimiter}DESCRIPTION)
+
+Relationship record format:
+("relationship"{tuple_delimiter}SOURCE_ENTITY_NAME{tuple_delimiter}TARGET_ENTITY_NAME{tuple_delimiter}DESCRIPTION{tuple_delimiter}STRENGTH)
+
+---
+
+**Example:**
+("document"{tuple_delimiter}doc_1){record_delimiter}
+("entity"{tuple_delimiter}LUNG{tuple_delimiter}anatomy{tuple_delimiter}part of respiratory system){record_delimiter}
+("entity"{tuple_delimiter}NODULE{tuple_delimiter}finding{tuple_delimiter}abnormal tissue growth){record_delimiter}
+("relationship"{tuple_delimiter}LUNG{tuple_delimiter}NODULE{tuple_delimiter}location of finding{tuple_delimiter}strong){record_delimiter}
+("document"{tuple_delimiter}doc_2){record_delimiter}
+("entity"{tuple_delimiter}HEART{tuple_delimiter}anatomy{tuple_delimiter}heart size is normal){record_delimiter}
+{completion_delimiter}
+
+---
+
+Reports to process:
+{input_text}
+"""
+
 PROMPTS[
     "summarize_entity_descriptions"
 ] = """You are a helpful assistant responsible for generating a comprehensive summary of the data provided below.
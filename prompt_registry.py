@@ -0,0 +1,129 @@
+# prompt_registry.py
+import os
+import string
+import threading
+import importlib.util
+from config import TUPLE_DELIM, RECORD_DELIM, COMPLETION_DELIM
+
+PROMPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Fields that never change between calls; everything else is filled per request
+STATIC_FIELDS = {
+    "tuple_delimiter": TUPLE_DELIM,
+    "record_delimiter": RECORD_DELIM,
+    "completion_delimiter": COMPLETION_DELIM,
+}
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when it is installed, otherwise estimate ~4 characters per token"""
+    try:
+        import tiktoken
+    except ImportError:
+        return max(1, len(text) // 4)
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+class CompiledPrompt:
+    """A template with its static fields rendered once and the per-request fields left as slots"""
+
+    def __init__(self, name: str, template: str, static: dict):
+        self.name = name
+        fields = [f for _, f, _, _ in string.Formatter().parse(template) if f]
+        self.dynamic_fields = [f for f in dict.fromkeys(fields) if f not in static]
+        # Render once with unique sentinels in place of the dynamic fields, then cut at them
+        sentinels = {f: f"\x00{f}\x00" for f in self.dynamic_fields}
+        rendered = template.format(**static, **sentinels)
+        parts = rendered.split("\x00")
+        self._segments = parts[0::2]
+        self._slots = parts[1::2]
+        self.static_prefix = self._segments[0]
+
+    def render(self, **values) -> str:
+        """Fill the dynamic fields; only string joins happen per call"""
+        out = [self._segments[0]]
+        for slot, segment in zip(self._slots, self._segments[1:]):
+            out.append(str(values[slot]))
+            out.append(segment)
+        return "".join(out)
+
+    def prefix_is_invariant(self) -> bool:
+        """Whether all dynamic fields sit at the end, so the whole prefix can be cached by providers"""
+        return all(not segment.strip() for segment in self._segments[1:])
+
+
+class PromptRegistry:
+    """Lazily loaded prompt modules with cached, pre-rendered templates"""
+
+    def __init__(self, modules=None, default_module="prompt_iuxray"):
+        # Module name -> file path; modules are only executed on first use
+        self.modules = modules or {
+            "prompt_iuxray": os.path.join(PROMPT_DIR, "prompt_iuxray.py"),
+            "prompt_mmgraphrag": os.path.join(PROMPT_DIR, "prompt_mmgraphrag.py"),
+        }
+        self.default_module = default_module
+        self._loaded = {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def prompts(self, module: str = None) -> dict:
+        """Return the PROMPTS dict of a prompt module, loading it on first access"""
+        module = module or self.default_module
+        with self._lock:
+            if module not in self._loaded:
+                spec = importlib.util.spec_from_file_location(module, self.modules[module])
+                loaded = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(loaded)
+                self._loaded[module] = getattr(loaded, "PROMPTS", {})
+            return self._loaded[module]
+
+    def get(self, name: str, default=None, module: str = None):
+        """Return a raw prompt entry"""
+        return self.prompts(module).get(name, default)
+
+    def compile(self, name: str, module: str = None, **static) -> CompiledPrompt:
+        """Return the template pre-rendered with the delimiters and the given static fields"""
+        module = module or self.default_module
+        static = dict(STATIC_FIELDS, **static)
+        key = (module, name, tuple(sorted(static.items())))
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            template = self.get(name, module=module)
+            if not template:
+                raise RuntimeError(f"{name} prompt not found in {module}.py")
+            compiled = CompiledPrompt(name, template, static)
+            self._compiled[key] = compiled
+        return compiled
+
+    def render(self, name: str, module: str = None, static: dict = None, **values) -> str:
+        """Render a template, reusing its pre-rendered static portion"""
+        return self.compile(name, module, **(static or {})).render(**values)
+
+    def token_report(self, module: str = None, **static) -> dict:
+        """Tokens of the static prefix and of the full template with empty dynamic fields, per template"""
+        report = {}
+        for name, template in self.prompts(module).items():
+            if not isinstance(template, str) or "{" not in template:
+                continue
+            try:
+                compiled = self.compile(name, module, **static)
+            except (KeyError, IndexError, ValueError):
+                # Templates with literal braces that are not format strings
+                continue
+            report[name] = {
+                "prefix_tokens": count_tokens(compiled.static_prefix),
+                "template_tokens": count_tokens(compiled.render(**{f: "" for f in compiled.dynamic_fields})),
+                "dynamic_fields": compiled.dynamic_fields,
+                "invariant_prefix": compiled.prefix_is_invariant(),
+            }
+        return report
+
+
+PROMPT_REGISTRY = PromptRegistry()
+
+
+if __name__ == "__main__":
+    entity_types = ",".join(PROMPT_REGISTRY.get("DEFAULT_ENTITY_TYPES", []))
+    for name, stats in PROMPT_REGISTRY.token_report(entity_types=entity_types).items():
+        print(f"{name:40s} prefix={stats['prefix_tokens']:5d} template={stats['template_tokens']:5d} "
+              f"fields={','.join(stats['dynamic_fields']) or '-'}")
@@ -0,0 +1,122 @@
+import sys
+import copy
+import time
+import functools
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(obj, _seen=None):
+    """Roughly estimate the memory footprint of a cached value in bytes"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if hasattr(obj, "items"):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    return size
+
+
+class QueryCache:
+    """In-process LRU cache with a per-entry time-to-live.
+
+    Callers get their own copy of a cached value, so modifying a result
+    cannot change what later lookups return.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.memory_bytes = 0
+        # Bumped by invalidate() so a load that overlapped a write is not stored
+        self._generation = 0
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[2])
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        stored = copy.deepcopy(value)
+        size = estimate_size(stored)
+        with self._lock:
+            if generation != self._generation:
+                # The graph changed while loading; the value may predate the write
+                return value
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, stored)
+            self.memory_bytes += size
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return value
+
+    def invalidate(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+            self._generation += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.memory_bytes -= size
+
+    def stats(self):
+        """Return hit rate and memory usage statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_bytes": self.memory_bytes,
+            }
+
+
+def cached_read(method):
+    """Serve a read method of an object with a `cache` attribute through that cache"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        return self.cache.get_or_load(key, lambda: method(self, *args, **kwargs))
+    return wrapper
+
+
+def invalidates_cache(method):
+    """Invalidate the object's `cache` after a write method runs"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate()
+    return wrapper
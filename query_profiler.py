@@ -0,0 +1,66 @@
+import json
+import threading
+from collections import defaultdict
+
+
+def _walk_plan(plan):
+    """Yield every operator of a PROFILE plan tree"""
+    if not plan:
+        return
+    yield plan
+    for child in plan.get("children", []):
+        yield from _walk_plan(child)
+
+
+class QueryProfiler:
+    """Aggregate per-method timing, row counts and PROFILE statistics of Cypher queries"""
+
+    def __init__(self, profile=False, report_path=None):
+        # When profile is set, queries are prefixed with PROFILE to capture db hits and operators
+        self.profile = profile
+        self.report_path = report_path
+        self._lock = threading.Lock()
+        self._methods = defaultdict(lambda: {
+            "calls": 0,
+            "rows": 0,
+            "wall_ms": 0.0,
+            "max_wall_ms": 0.0,
+            "result_available_after_ms": 0,
+            "result_consumed_after_ms": 0,
+            "db_hits": 0,
+            "operators": defaultdict(int),
+        })
+
+    def record(self, method, wall_seconds, rows, summary):
+        """Record one executed query of a client method"""
+        wall_ms = wall_seconds * 1000
+        with self._lock:
+            stats = self._methods[method]
+            stats["calls"] += 1
+            stats["rows"] += rows
+            stats["wall_ms"] += wall_ms
+            stats["max_wall_ms"] = max(stats["max_wall_ms"], wall_ms)
+            stats["result_available_after_ms"] += summary.result_available_after or 0
+            stats["result_consumed_after_ms"] += summary.result_consumed_after or 0
+            for operator in _walk_plan(summary.profile):
+                stats["db_hits"] += operator.get("dbHits", 0)
+                # Strip the runtime suffix, e.g. "NodeIndexSeek@neo4j"
+                stats["operators"][operator.get("operatorType", "").split("@")[0]] += 1
+
+    def report(self):
+        """Return aggregated statistics per method, slowest first"""
+        with self._lock:
+            report = {}
+            for method, stats in self._methods.items():
+                report[method] = dict(stats, operators=dict(stats["operators"]))
+                report[method]["mean_wall_ms"] = stats["wall_ms"] / stats["calls"]
+        return dict(sorted(report.items(), key=lambda item: item[1]["wall_ms"], reverse=True))
+
+    def dump(self, path=None):
+        """Write the aggregated report as JSON"""
+        path = path or self.report_path
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Query profile report saved to {path}")
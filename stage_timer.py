@@ -0,0 +1,120 @@
+# stage_timer.py
+import json
+import math
+import time
+import bisect
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# Upper bounds (ms) of the latency histogram buckets; slower samples go to a final overflow bucket
+HISTOGRAM_BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class StageTimer:
+    """Thread-safe wall-time samples per stage and named counters (tokens, round trips, ...)"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def snapshot(self) -> dict:
+        """Raw samples and counters, e.g. to send from a worker process to the parent"""
+        with self._lock:
+            return {"samples": {k: list(v) for k, v in self.samples.items()}, "counters": dict(self.counters)}
+
+    def merge(self, snapshot: dict):
+        with self._lock:
+            for stage, values in snapshot["samples"].items():
+                self.samples[stage].extend(values)
+            for name, n in snapshot["counters"].items():
+                self.counters[name] += n
+
+    def summary(self) -> dict:
+        """Per-stage count, total seconds and mean/p50/p95/p99/max milliseconds"""
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self.samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "total_s": sum(values),
+                "mean_ms": sum(values) / len(values) * 1000,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+            for stage, values in samples.items() if values
+        }
+
+    def histogram(self, bounds_ms=HISTOGRAM_BOUNDS_MS) -> dict:
+        """Per-stage sample counts in buckets with the given upper bounds, plus an overflow bucket"""
+        with self._lock:
+            samples = {k: list(v) for k, v in self.samples.items()}
+        histograms = {}
+        for stage, values in samples.items():
+            counts = [0] * (len(bounds_ms) + 1)
+            for seconds in values:
+                counts[bisect.bisect_left(bounds_ms, seconds * 1000)] += 1
+            histograms[stage] = counts
+        return histograms
+
+    def print_histogram(self, stages=None, bounds_ms=HISTOGRAM_BOUNDS_MS):
+        """Print one row of bucket counts per stage"""
+        labels = [f"<={b}ms" if b < 1000 else f"<={b / 1000:g}s" for b in bounds_ms] + [f">{bounds_ms[-1] / 1000:g}s"]
+        print(f"{'stage':22s} " + " ".join(f"{label:>8s}" for label in labels))
+        for stage, counts in sorted(self.histogram(bounds_ms).items()):
+            if stages is None or stage in stages:
+                print(f"{stage:22s} " + " ".join(f"{n:8d}" for n in counts))
+
+    def report(self, wall_seconds: float, path: str = None) -> dict:
+        """Print a human summary and optionally write the full report as JSON"""
+        counters = dict(self.counters)
+        report = {
+            "wall_seconds": wall_seconds,
+            "docs_per_second": counters.get("documents", 0) / wall_seconds if wall_seconds else 0.0,
+            "images_per_second": counters.get("images", 0) / wall_seconds if wall_seconds else 0.0,
+            "stages": self.summary(),
+            "counters": counters,
+        }
+        print(f"\n{report['docs_per_second']:.2f} docs/s, {report['images_per_second']:.2f} images/s "
+              f"over {wall_seconds:.1f}s")
+        print(f"{'stage':22s} {'count':>7s} {'total s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+        for stage, stats in sorted(report["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+            print(f"{stage:22s} {stats['count']:7d} {stats['total_s']:9.2f} {stats['p50_ms']:9.1f} "
+                  f"{stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f}")
+        print(", ".join(f"{name}={n}" for name, n in sorted(counters.items())))
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        return report
+
+
+# Process-wide timer the extractor, image processor, Neo4j client and main record into
+TIMER = StageTimer()
@@ -0,0 +1,296 @@
+# vqa_server.py
+"""Long-lived VQA service: CLIP, the Neo4j driver pool and the LLM client are loaded once.
+
+Endpoints (JSON over HTTP/1.1, on TCP or a Unix socket):
+    POST /answer   {"image": path, "question": text}  -> {"answer", "seconds"}
+    POST /similar  {"image": path, "top_k": 5}         -> {"similar": [[path, similarity], ...], "seconds"}
+    GET  /healthz  the process is up
+    GET  /readyz   models are loaded and Neo4j is reachable (503 until then)
+
+Usage:
+    python vqa_server.py --port 8765 --workers 4
+    python vqa_server.py --unix-socket /tmp/vqa.sock
+    python vqa_test.py --interactive --server http://127.0.0.1:8765
+"""
+import json
+import time
+import socket
+import signal
+import asyncio
+import argparse
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from config import VQA_SERVER_URL, VQA_SERVER_WORKERS
+
+MAX_BODY_BYTES = 1 << 20
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class VQAServer:
+    """Answers questions with one shared VQATester; blocking model and database calls run in a thread pool"""
+
+    def __init__(self, workers=VQA_SERVER_WORKERS):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vqa")
+        self.tester = None
+        self.load_error = None
+        self.requests = 0
+        # Open connections, mapped to whether they are idle between requests
+        self._connections = {}
+        self.closing = False
+
+    def _load(self):
+        # The import itself pulls in torch and transformers, so it happens off the event loop too
+        from vqa_test import VQATester
+        return VQATester(verbose=False)
+
+    async def load(self):
+        """Load CLIP and connect to Neo4j in the background; /readyz reports 503 until this finishes"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            self.tester = await loop.run_in_executor(self.executor, self._load)
+            print(f"[VQA] Models loaded in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            self.load_error = e
+            print(f"[VQA] Failed to load models: {e}")
+
+    def _check_ready(self):
+        self.tester.client.driver.verify_connectivity()
+
+    async def route(self, method, path, body):
+        """Status and JSON payload for one request"""
+        loop = asyncio.get_running_loop()
+        if path == "/healthz":
+            return 200, {"status": "ok"}
+        if path == "/readyz":
+            if self.tester is None:
+                reason = f"failed to load: {self.load_error}" if self.load_error else "loading"
+                return 503, {"status": reason}
+            try:
+                await loop.run_in_executor(self.executor, self._check_ready)
+            except Exception as e:
+                return 503, {"status": f"neo4j unavailable: {e}"}
+            return 200, {"status": "ready", "workers": self.workers, "requests": self.requests}
+        if path not in ("/answer", "/similar"):
+            raise HTTPError(404, f"no endpoint {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} expects POST")
+        if self.tester is None:
+            raise HTTPError(503, "models are still loading")
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        if not isinstance(request, dict) or not request.get("image"):
+            raise HTTPError(400, "missing 'image'")
+
+        self.requests += 1
+        start = time.perf_counter()
+        if path == "/similar":
+            try:
+                top_k = int(request.get("top_k", 5))
+            except (TypeError, ValueError):
+                raise HTTPError(400, "'top_k' must be an integer")
+            if top_k < 1:
+                raise HTTPError(400, "'top_k' must be at least 1")
+            similar = await loop.run_in_executor(self.executor, self.tester.find_similar_images,
+                                                 request["image"], top_k)
+            if similar is None:
+                raise HTTPError(400, f"could not read image {request['image']}")
+            return 200, {"similar": similar, "seconds": time.perf_counter() - start}
+        if not request.get("question"):
+            raise HTTPError(400, "missing 'question'")
+        answer = await loop.run_in_executor(self.executor, self.tester.answer_question,
+                                            request["image"], request["question"])
+        return 200, {"answer": answer, "seconds": time.perf_counter() - start}
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client closes it or asks to"""
+        self._connections[writer] = True
+        try:
+            while not self.closing:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                self._connections[writer] = False
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() == "HTTP/1.1" and not self.closing)
+                length = headers.get("content-length", "0") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self._respond(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.route(method.upper(), urlparse(target).path.rstrip("/"), body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    print(f"[VQA] {method} {target} failed: {e}")
+                    status, payload = 500, {"error": str(e)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+                self._connections[writer] = True
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def drain(self, timeout=60.0):
+        """Stop reading new requests, close idle connections and wait for in-flight answers"""
+        self.closing = True
+        for writer, idle in list(self._connections.items()):
+            if idle:
+                writer.close()
+        deadline = time.monotonic() + timeout
+        while self._connections and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.tester is not None:
+            self.tester.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class VQAClient:
+    """Minimal blocking client for vqa_server.py; url is http://host:port or unix:/path/to/socket"""
+
+    def __init__(self, url=VQA_SERVER_URL, timeout=300.0):
+        self.url = url
+        self.timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        parsed = urlparse(self.url)
+        if parsed.scheme == "unix":
+            return _UnixHTTPConnection(parsed.path, self.timeout)
+        return http.client.HTTPConnection(parsed.hostname or "127.0.0.1", parsed.port or 80, timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        # The connection is kept alive between questions and reopened once if the server dropped it
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                data = json.loads(response.read() or b"{}")
+                break
+            except (http.client.HTTPException, OSError) as e:
+                self._connection.close()
+                self._connection = None
+                if attempt or not isinstance(e, (ConnectionResetError, BrokenPipeError)):
+                    raise ConnectionError(f"{self.url}: {e}") from e
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path}: {response.status} {data.get('error') or data.get('status')}")
+        return data
+
+    def answer(self, image_path, question):
+        return self._request("POST", "/answer", {"image": image_path, "question": question})
+
+    def similar(self, image_path, top_k=5):
+        return self._request("POST", "/similar", {"image": image_path, "top_k": top_k})["similar"]
+
+    def ready(self) -> bool:
+        try:
+            self._request("GET", "/readyz")
+            return True
+        except (OSError, RuntimeError):
+            return False
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+async def serve(args):
+    server = VQAServer(workers=args.workers)
+    if args.unix_socket:
+        listener = await asyncio.start_unix_server(server.handle, path=args.unix_socket)
+        address = f"unix:{args.unix_socket}"
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+        address = f"http://{args.host}:{args.port}"
+    print(f"[VQA] Listening on {address} with {args.workers} workers")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    # Requests are accepted (and answered 503) while the models load
+    loading = asyncio.ensure_future(server.load())
+    await stop.wait()
+    print("[VQA] Shutting down")
+    # Stop accepting first, then drain: since Python 3.12 wait_closed() also waits for open
+    # connections, so it must come after drain() has closed the idle keep-alive ones
+    listener.close()
+    await server.drain()
+    await listener.wait_closed()
+    await loading
+    server.close()
+
+
+def main():
+    default = urlparse(VQA_SERVER_URL)
+    parser = argparse.ArgumentParser(description="Persistent VQA service wrapping VQATester")
+    parser.add_argument("--host", type=str, default=default.hostname or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=default.port or 8765)
+    parser.add_argument("--unix-socket", type=str, default=None, help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=VQA_SERVER_WORKERS,
+                        help=f"Questions answered concurrently (default: {VQA_SERVER_WORKERS})")
+    args = parser.parse_args()
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,133 @@
 import os
 import json
+import time
 import argparse
-from neo4j_client import Neo4jClient
-from image_processor import ImageProcessor
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from extractor import call_llm_entity_extraction, parse_entity_extraction_output
-from config import USE_OPENAI
+from config import USE_OPENAI, VQA_SERVER_URL, VQA_SERVER_WORKERS
+from vqa_server import VQAClient
+from dedup import report_fingerprint
+from stage_timer import TIMER
 import openai
 
+# Stages shown in the batch latency histogram
+VQA_STAGES = ("vqa_total", "vqa_embed_image", "image_decode", "clip_image_forward", "vqa_retrieval",
+              "vqa_image_context", "vqa_question_entities", "clip_text_forward", "vqa_llm")
+
 class VQATester:
-    def __init__(self):
-        self.client = Neo4jClient()
+    def __init__(self, verbose=True):
+        # Imported here so that the thin client modes never load torch, CLIP or the Neo4j driver
+        from neo4j_client import Neo4jClient
+        from image_processor import ImageProcessor
         self.image_processor = ImageProcessor()
+        self.client = Neo4jClient(text_encoder=self.image_processor.extract_text_features_batch)
+        # vqa_server.py answers many questions and turns the per-question printing off
+        self.verbose = verbose
+        # Graphs ingested without the entity vector index (or on Neo4j before 5.11) cannot answer
+        # db.index.vector.queryNodes, so semantic entity lookup is skipped for them
+        self.semantic_lookup = self.client.has_vector_index()
+        if not self.semantic_lookup:
+            print("Entity vector index not available; answering without question entities.")
+        # Image features shared by all questions about the same image, computed once even when
+        # several threads ask for them at the same time
+        self._features = {}
+        self._features_lock = threading.Lock()
+        self.max_shared_features = 4096
+    
+    def image_features(self, image_path):
+        """CLIP features of an image, extracted once per path"""
+        with self._features_lock:
+            future = self._features.get(image_path)
+            owner = future is None
+            if owner:
+                if len(self._features) >= self.max_shared_features:
+                    # Forget the oldest image
+                    self._features.pop(next(iter(self._features)))
+                future = self._features[image_path] = Future()
+        if owner:
+            try:
+                future.set_result(self.image_processor.extract_features(image_path))
+            except Exception as e:
+                future.set_exception(e)
+            if future.exception() is not None or future.result() is None:
+                # A failed read is not kept, so a later question about the image tries again
+                with self._features_lock:
+                    if self._features.get(image_path) is future:
+                        del self._features[image_path]
+        return future.result()
+    
+    def find_similar_images(self, image_path, top_k=3, exclude_doc_id=None):
+        """Stored images most similar to the input image as (path, similarity), or None if it cannot be read"""
+        with TIMER.time("vqa_embed_image"):
+            query_features = self.image_features(image_path)
+        if query_features is None:
+            return None
+        with TIMER.time("vqa_retrieval"):
+            similar = self.client.find_similar_images(query_features, top_k=top_k, exclude_doc_id=exclude_doc_id)
+            return [(path, float(similarity)) for path, similarity in similar]
     
     def answer_question(self, image_path, question_text):
         """Answer a question based on an image and text query"""
-        print(f"Processing image: {image_path}")
-        print(f"Question: {question_text}")
-        
-        # Extract features from the input image
-        query_features = self.image_processor.extract_features(image_path)
-        if query_features is None:
-            return "Error: Could not process the input image."
+        return self.answer_with_context(image_path, question_text)["answer"]
+    
+    def answer_with_context(self, image_path, question_text, top_k=3, exclude_self=False):
+        """Answer a question and report the similar images and document the answer was based on.
+
+        exclude_self drops every image of the input image's own document (the other
+        views of the same study too) from the similar images, for questions about
+        images that are themselves stored in the graph.
+        """
+        result = {"answer": None, "similar_images": [], "doc_id": None}
+        if self.verbose:
+            print(f"Processing image: {image_path}")
+            print(f"Question: {question_text}")
         
         # Find similar images in the database
-        similar_images = self.client.find_similar_images(query_features, top_k=3)
+        exclude_doc_id = None
+        if exclude_self:
+            own_document = self.client.get_document_by_image(image_path)
+            exclude_doc_id = own_document["doc_id"] if own_document else None
+        similar_images = self.find_similar_images(image_path, top_k + 1 if exclude_self else top_k, exclude_doc_id)
+        if similar_images is None:
+            result["answer"] = "Error: Could not process the input image."
+            result["error"] = f"could not embed image {image_path}"
+            return result
+        if exclude_self:
+            # The path check covers an input image stored under a differently written path
+            own_path = os.path.normpath(image_path)
+            similar_images = [(p, sim) for p, sim in similar_images if os.path.normpath(p) != own_path][:top_k]
+        result["similar_images"] = similar_images
         
         if not similar_images:
-            return "No similar images found in the database."
+            result["answer"] = "No similar images found in the database."
+            return result
         
-        print(f"Found {len(similar_images)} similar images:")
-        for img_path, similarity in similar_images:
-            print(f"  - {img_path} (similarity: {similarity:.3f})")
+        if self.verbose:
+            print(f"Found {len(similar_images)} similar images:")
+            for img_path, similarity in similar_images:
+                print(f"  - {img_path} (similarity: {similarity:.3f})")
         
         # Get the most similar image
         most_similar_image = similar_images[0][0]
         
-        # Get document associated with the image
-        document = self.client.get_document_by_image(most_similar_image)
-        if document is None:
-            return "No document associated with the similar image."
-        
-        # Get entities associated with the image
-        entities = self.client.get_entities_by_image(most_similar_image)
+        # Get document, entities and related entities of the image in one round trip
+        with TIMER.time("vqa_image_context"):
+            image_context = self.client.get_image_context(most_similar_image)
+        if image_context is None:
+            result["answer"] = "No document associated with the similar image."
+            return result
+        result["doc_id"] = image_context["document"]["doc_id"]
         
         # Prepare context for the LLM
-        context = self._prepare_context(document, entities, question_text)
+        context = self._prepare_context(image_context["document"], image_context["entities"], question_text)
         
         # Generate answer using LLM
-        answer = self._generate_answer(context, question_text)
+        with TIMER.time("vqa_llm"):
+            result["answer"] = self._generate_answer(context, question_text)
         
-        return answer
+        return result
     
     def _prepare_context(self, document, entities, question_text):
         """Prepare context information for the LLM"""
@@ -61,11 +139,9 @@ class VQATester:
             "entities": entities,
             "question": question_text
         }
-        
-        # Add related entities for each entity
-        for entity in context["entities"]:
-            related_entities = self.client.get_related_entities(entity["name"], entity["type"])
-            entity["related_entities"] = related_entities
+        if self.semantic_lookup:
+            with TIMER.time("vqa_question_entities"):
+                context["question_entities"] = self.client.find_similar_entities(question_text, top_k=5)
         
         return context
     
@@ -77,7 +153,8 @@ class VQATester:
         # Prepare prompt for the LLM
         prompt = self._create_prompt(context, question_text)
 
-        print("prompt: ", prompt)
+        if self.verbose:
+            print("prompt: ", prompt)
         
         try:
             response = openai.ChatCompletion.create(
@@ -114,6 +191,12 @@ class VQATester:
             
             entity_info += "\n"
         
+        # Format entities semantically related to the question
+        if context.get("question_entities"):
+            entity_info += "Entities related to the question:\n"
+            for entity in context["question_entities"]:
+                entity_info += f"- {entity['name']} ({entity['type']}) - {entity['description']}\n"
+        
         prompt = f"""
 Based on the following medical context, please answer the question: "{question_text}"
 
@@ -131,39 +214,171 @@ ANSWER:
     
     def close(self):
         """Close connections"""
+        cache_stats = self.client.cache_stats()
+        if cache_stats:
+            print(f"Query cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                  f"(hit rate {cache_stats['hit_rate']:.1%}, {cache_stats['memory_bytes']} bytes)")
         self.client.close()
 
+def iter_batch_rows(path):
+    """Yield (index, row) for each {"image", "question"[, "reference"]} line of a JSONL file"""
+    with open(path, "r", encoding="utf-8") as f:
+        for idx, line in enumerate(f):
+            if line.strip():
+                yield idx, json.loads(line)
+
+def own_report_fingerprint(vqa_tester, row):
+    """Fingerprint of the report the row's image belongs to (its "report" field, or its document in the graph)"""
+    if row.get("report"):
+        return report_fingerprint(row["report"])
+    document = vqa_tester.client.get_document_by_image(row["image"])
+    return report_fingerprint(document["text"]) if document else None
+
+def answer_row(vqa_tester, idx, row, top_k=3, exclude_self=True):
+    """Answer one batch row; the result records the retrieval hit against the image's own report"""
+    start = time.perf_counter()
+    result = {"index": idx, "image": row.get("image"), "question": row.get("question")}
+    if "reference" in row:
+        result["reference"] = row["reference"]
+    try:
+        if not row.get("image") or not row.get("question"):
+            raise ValueError("row needs 'image' and 'question'")
+        result.update(vqa_tester.answer_with_context(row["image"], row["question"], top_k, exclude_self))
+        # Rows whose image could not be embedded never reached retrieval and are not judged
+        own = None if "error" in result else own_report_fingerprint(vqa_tester, row)
+        if own is not None:
+            # A retrieved image counts as a hit if its document has the same (normalized) report
+            hits = []
+            for path, _ in result["similar_images"]:
+                document = vqa_tester.client.get_document_by_image(path)
+                hits.append(document is not None and report_fingerprint(document["text"]) == own)
+            result["retrieval_hit"] = bool(hits) and hits[0]
+            result["retrieval_hit_at_k"] = any(hits)
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    TIMER.add("vqa_total", result["seconds"])
+    return result
+
+def run_batch(vqa_tester, input_path, output_path, concurrency=VQA_SERVER_WORKERS, top_k=3, exclude_self=True):
+    """Answer every row of a JSONL file with bounded parallelism, writing each result as soon as it is ready"""
+    stats = {"rows": 0, "errors": 0, "judged": 0, "hits": 0, "hits_at_k": 0}
+    start = time.perf_counter()
+    rows = iter_batch_rows(input_path)
+    pending = set()
+    with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            # Only a couple of rows per worker are read ahead of the answers
+            for idx, row in itertools.islice(rows, max(0, concurrency * 2 - len(pending))):
+                pending.add(executor.submit(answer_row, vqa_tester, idx, row, top_k, exclude_self))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                stats["rows"] += 1
+                stats["errors"] += "error" in result
+                if "retrieval_hit" in result:
+                    stats["judged"] += 1
+                    stats["hits"] += result["retrieval_hit"]
+                    stats["hits_at_k"] += result["retrieval_hit_at_k"]
+            out.flush()
+    stats["seconds"] = time.perf_counter() - start
+    stats["exclude_self"] = exclude_self
+    return stats
+
+def print_batch_report(stats, top_k):
+    seconds = stats["seconds"]
+    print(f"\nAnswered {stats['rows']} questions in {seconds:.1f}s "
+          f"({stats['rows'] / seconds if seconds else 0.0:.2f} questions/s), {stats['errors']} errors")
+    if stats["judged"]:
+        # With its own study retrievable, a stored image trivially finds its own report through the other view
+        own_image = "own study's images excluded" if stats["exclude_self"] else "own study's images included"
+        print(f"Retrieval hit against the image's own report ({own_image}): "
+              f"top-1 {stats['hits'] / stats['judged']:.1%}, top-{top_k} {stats['hits_at_k'] / stats['judged']:.1%} "
+              f"({stats['judged']} rows judged)")
+    print("\nLatency histogram by stage:")
+    TIMER.print_histogram(stages=VQA_STAGES)
+    summary = TIMER.summary()
+    print(f"\n{'stage':22s} {'count':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    for stage in VQA_STAGES:
+        if stage in summary:
+            s = summary[stage]
+            print(f"{stage:22s} {s['count']:7d} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f} {s['p99_ms']:9.1f}")
+
+def run_interactive(client):
+    """Ask questions through a running vqa_server.py until the user types quit"""
+    print("Running in interactive mode. Type 'quit' to exit.")
+    while True:
+        image_path = input("Enter image path: ").strip()
+        if image_path.lower() == 'quit':
+            break
+            
+        question = input("Enter your question: ").strip()
+        if question.lower() == 'quit':
+            break
+        
+        try:
+            result = client.answer(image_path, question)
+        except (OSError, RuntimeError) as e:
+            print(f"VQA server error: {e}")
+            continue
+        print("\nANSWER:")
+        print(result["answer"])
+        print(f"({result['seconds']:.2f}s)")
+        print("\n" + "="*50 + "\n")
+
 def main():
     parser = argparse.ArgumentParser(description="VQA Test for Multimodal RAG Graph")
-    parser.add_argument("--image", required=True, help="Path to the input image")
-    parser.add_argument("--question", required=True, help="Question to ask about the image")
-    parser.add_argument("--interactive", action="store_true", help="Run in interactive mode")
+    parser.add_argument("--image", help="Path to the input image")
+    parser.add_argument("--question", help="Question to ask about the image")
+    parser.add_argument("--interactive", action="store_true",
+                        help="Ask questions through a running vqa_server.py instead of loading the models here")
+    parser.add_argument("--batch", type=str, default=None,
+                        help='JSONL file of {"image", "question"[, "reference", "report"]} rows to answer')
+    parser.add_argument("--output", type=str, default="vqa_results.jsonl",
+                        help="JSONL file the --batch results are streamed to (default: vqa_results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=VQA_SERVER_WORKERS,
+                        help=f"Questions answered at the same time in --batch mode (default: {VQA_SERVER_WORKERS})")
+    parser.add_argument("--top-k", type=int, default=3,
+                        help="Similar images retrieved per question in --batch mode (default: 3)")
+    parser.add_argument("--include-self", action="store_true",
+                        help="In --batch mode, let a question retrieve the images of its own image's document "
+                             "(excluded by default, since they are a trivial retrieval hit)")
+    parser.add_argument("--server", type=str, default=None,
+                        help=f"vqa_server.py address, http://host:port or unix:/path/to/socket "
+                             f"(default for --interactive: {VQA_SERVER_URL})")
     
     args = parser.parse_args()
+    if not (args.interactive or args.batch) and not (args.image and args.question):
+        parser.error("--image and --question are required unless --interactive or --batch is given")
     
-    vqa_tester = VQATester()
-    
-    if args.interactive:
-        print("Running in interactive mode. Type 'quit' to exit.")
-        while True:
-            image_path = input("Enter image path: ").strip()
-            if image_path.lower() == 'quit':
-                break
-                
-            question = input("Enter your question: ").strip()
-            if question.lower() == 'quit':
-                break
-                
-            answer = vqa_tester.answer_question(image_path, question)
-            print("\nANSWER:")
-            print(answer)
-            print("\n" + "="*50 + "\n")
+    if args.batch:
+        vqa_tester = VQATester(verbose=False)
+        try:
+            stats = run_batch(vqa_tester, args.batch, args.output, args.concurrency, args.top_k,
+                              exclude_self=not args.include_self)
+        finally:
+            vqa_tester.close()
+        print(f"Results written to {args.output}")
+        print_batch_report(stats, args.top_k)
+    elif args.interactive:
+        client = VQAClient(args.server or VQA_SERVER_URL)
+        if not client.ready():
+            print(f"No ready VQA server at {client.url}; start one with: python vqa_server.py")
+            return
+        run_interactive(client)
+    elif args.server:
+        answer = VQAClient(args.server).answer(args.image, args.question)["answer"]
+        print("\nANSWER:")
+        print(answer)
     else:
+        vqa_tester = VQATester()
         answer = vqa_tester.answer_question(args.image, args.question)
         print("\nANSWER:")
         print(answer)
-    
-    vqa_tester.close()
+        vqa_tester.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()